@@ -0,0 +1,66 @@
+"""
+本地分类器基准：用合成的良性群聊 / 攻击语料训练逻辑回归分类器（需要 NumPy），
+报告留出集准确率、阈值区间外的本地判定覆盖率，以及单条推理（特征提取 + 点积）的 p50 / p99 耗时。
+
+用法：python benchmarks/bench_classifier.py [--benign 4000] [--attacks 1000] [--low 0.1] [--high 0.9]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import attack_messages, benign_long_messages, benign_messages  # noqa: E402
+from ptd_classifier import train_classifier  # noqa: E402
+from ptd_core import PromptThreatDetector  # noqa: E402
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def measure(classifier, detector, messages):
+    analyses = [detector.analyze(text) for text in messages]
+    timings = []
+    for text, analysis in zip(messages, analyses):
+        start = time.perf_counter()
+        classifier.predict(text, analysis)
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 0.5), percentile(timings, 0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--benign", type=int, default=4000)
+    parser.add_argument("--attacks", type=int, default=1000)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--low", type=float, default=0.1)
+    parser.add_argument("--high", type=float, default=0.9)
+    args = parser.parse_args()
+
+    detector = PromptThreatDetector()
+    samples = [(text, 0, "bench") for text in benign_messages(args.benign)]
+    samples += [(text, 1, "bench") for text in attack_messages(args.attacks)]
+    start = time.perf_counter()
+    classifier = train_classifier(samples, detector, epochs=args.epochs, low=args.low, high=args.high)
+    elapsed = time.perf_counter() - start
+    holdout = classifier.meta["holdout"]
+    print(f"训练：{len(samples)} 条样本，{elapsed:.2f} 秒，非零权重 {len(classifier.weights)} 个")
+    print(
+        f"留出集 {holdout['samples']} 条：准确率 {holdout['accuracy']:.1%}，精确率 {holdout['precision']:.1%}，"
+        f"召回率 {holdout['recall']:.1%}"
+    )
+    print(f"阈值 {args.low:g} / {args.high:g}：本地判定 {holdout['settled']:.1%}，其中错误 {holdout['settled_errors']} 条")
+    for label, messages in (
+        ("短消息", benign_messages(2000, seed=20240610)),
+        ("长消息", benign_long_messages(200, seed=20240611)),
+    ):
+        p50, p99 = measure(classifier, detector, messages)
+        print(f"  推理（{label}）：p50 {p50 * 1e6:8.1f} µs · p99 {p99 * 1e6:8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
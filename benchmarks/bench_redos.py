@@ -0,0 +1,123 @@
+"""
+正则回溯（ReDoS）模糊基准：为 regex_signatures 与 hate_request_patterns 中的每条正则生成最坏情况输入，
+测量不同长度下单次 search 的最长耗时与增长阶数，并检查回溯风险估计（regex_hazard）能否识别这些输入。
+
+- 攻击单元由 corpus.regex_attack_units 从正则语法树生成：截取前 k 个顶层结构、间隔取最少重复后反复拼接
+- 与检测器一致，输入先经规范化流水线再交给正则
+- 超出单条规则预算的规则：能被风险估计识别的记为「受保护」（实际运行时改在可终止的 worker 中带时限执行），
+  否则记为「未防护」
+
+用法：python benchmarks/bench_redos.py [--lengths 256,1024,4096] [--budget-ms 10] [--rule-pack PATH] [--fail-on-unguarded]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import regex_attack_units  # noqa: E402
+from ptd_core import PromptThreatDetector  # noqa: E402
+from ptd_normalize import normalize_text  # noqa: E402
+from ptd_rulepack import RulePack  # noqa: E402
+
+# 单次 search 超过该耗时后不再尝试更长的输入
+GIVE_UP_SECONDS = 2.0
+
+
+def rule_patterns(detector):
+    rules = [(signature["name"], signature["pattern"]) for signature in detector.regex_signatures]
+    rules.extend(
+        (detector.hate_request_rule_name(index), pattern) for index, pattern in enumerate(detector.hate_request_patterns)
+    )
+    return rules
+
+
+def build_input(unit, length, separator):
+    piece = unit + separator
+    return (piece * (length // len(piece) + 1))[:length]
+
+
+def time_search(pattern, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pattern.search(text)
+        best = min(best, time.perf_counter() - started)
+        if best > 0.05:
+            break
+    return best
+
+
+def fuzz_rule(pattern, lengths):
+    """返回各长度下的最坏耗时及对应输入（规范化后的文本）。"""
+    worst = {length: (0.0, "") for length in lengths}
+    for unit in regex_attack_units(pattern.pattern, pattern.flags):
+        for separator in ("", " "):
+            for length in lengths:
+                folded, normalized = normalize_text(build_input(unit, length, separator))
+                # 检测器对正则特征搜索 folded，对仇恨请求正则搜索 normalized，两者取较慢者
+                elapsed = max(time_search(pattern, folded, 3), time_search(pattern, normalized, 3))
+                if elapsed > worst[length][0]:
+                    worst[length] = (elapsed, normalized)
+                if elapsed > GIVE_UP_SECONDS:
+                    break
+    return worst
+
+
+def growth_order(worst, lengths):
+    """以最长两档输入的耗时比估计增长阶数（1 为线性，2 为平方）。"""
+    if len(lengths) < 2:
+        return 0.0
+    (short_time, _), (long_time, _) = worst[lengths[-2]], worst[lengths[-1]]
+    if short_time <= 0 or long_time <= 0:
+        return 0.0
+    return math.log(long_time / short_time) / math.log(lengths[-1] / lengths[-2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", default="256,1024,4096", help="输入长度（字符），逗号分隔")
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="单条规则预算，默认取检测器的 regex_rule_budget")
+    parser.add_argument("--rule-pack", default="", help="使用指定规则包（默认内置规则包）")
+    parser.add_argument("--rules", default="", help="只测试指定规则，逗号分隔")
+    parser.add_argument("--fail-on-unguarded", action="store_true", help="存在未防护的超预算规则时以非零状态退出")
+    args = parser.parse_args()
+
+    detector = PromptThreatDetector(RulePack(args.rule_pack)) if args.rule_pack else PromptThreatDetector()
+    lengths = sorted({int(item) for item in args.lengths.split(",") if item.strip()})
+    budget = args.budget_ms / 1000 if args.budget_ms > 0 else detector.regex_rule_budget
+    selected = {name.strip() for name in args.rules.split(",") if name.strip()}
+
+    print(f"PTD {detector.version}，规则集 {detector.ruleset_version}，单条规则预算 {budget * 1000:.1f} ms")
+    header = f"{'规则':<28}" + "".join(f"{f'{length} 字符':>14}" for length in lengths) + f"{'阶数':>7}  结论"
+    print(header)
+    unguarded = []
+    for name, pattern in rule_patterns(detector):
+        if selected and name not in selected:
+            continue
+        worst = fuzz_rule(pattern, lengths)
+        cells = "".join(f"{worst[length][0] * 1000:>11.2f} ms" for length in lengths)
+        over_budget = [text for elapsed, text in worst.values() if elapsed > budget]
+        hazards = [detector.regex_hazard(text) for text in over_budget]
+        if not over_budget:
+            verdict = "正常"
+        elif all(hazard is not None for hazard in hazards):
+            verdict = f"受保护（最低估计 {min(hazard.estimate for hazard in hazards)}）"
+        else:
+            verdict = "未防护"
+            unguarded.append(name)
+        print(f"{name:<28}{cells}{growth_order(worst, lengths):>7.2f}  {verdict}")
+
+    if unguarded:
+        print(f"\n超出预算且未被回溯风险估计识别的规则：{', '.join(unguarded)}")
+        if args.fail_on_unguarded:
+            sys.exit(1)
+    else:
+        print("\n超出预算的规则均可被回溯风险估计识别")
+
+
+if __name__ == "__main__":
+    main()
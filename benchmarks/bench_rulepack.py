@@ -0,0 +1,95 @@
+"""
+规则包冷启动基准：在内置规则包基础上合成数千条正则特征与特征词，对比
+「每次加载都重新编译」与「加载 __rulecache__ 编译工件」两条路径的检测器构造耗时。
+
+用法：python benchmarks/bench_rulepack.py [--signatures 2000] [--keywords 5000] [--rounds 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ptd_core import PromptThreatDetector  # noqa: E402
+from ptd_rulepack import DEFAULT_RULEPACK_PATH, RulePack  # noqa: E402
+
+VERBS = ["忽略", "覆盖", "泄露", "绕过", "重置", "ignore", "override", "reveal", "bypass", "disable"]
+OBJECTS = ["系统提示", "安全策略", "内部指令", "审查规则", "system prompt", "guardrails", "policy", "filters"]
+
+
+def synthesize_pack(path: str, signatures: int, keywords: int, seed: int = 20240601) -> None:
+    rng = random.Random(seed)
+    with open(DEFAULT_RULEPACK_PATH, encoding="utf-8") as handle:
+        pack = json.load(handle)
+    for index in range(signatures):
+        verb, obj = rng.choice(VERBS), rng.choice(OBJECTS)
+        pack["regex_signatures"].append(
+            {
+                "name": f"synthetic-{index}",
+                "pattern": f"{verb}.{{0,{rng.randint(4, 30)}}}{obj}{index:04d}",
+                "flags": ["IGNORECASE"],
+                "weight": rng.randint(1, 6),
+                "description": f"合成特征 {index}",
+            }
+        )
+    for index in range(keywords):
+        pack["keyword_weights"][f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} #{index}"] = rng.randint(1, 5)
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(pack, handle, ensure_ascii=False)
+
+
+def measure(build, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        build()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--signatures", type=int, default=2000)
+    parser.add_argument("--keywords", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ptd-rulepack-")
+    try:
+        path = os.path.join(workdir, "synthetic.json")
+        synthesize_pack(path, args.signatures, args.keywords)
+        cache_dir = os.path.join(workdir, "__rulecache__")
+
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            detector = PromptThreatDetector(RulePack(path, cache_dir=cache_dir))
+            # 旧实现在构造时即编译全部正则，这里同样强制编译以便对照
+            for signature in detector.regex_signatures:
+                signature["pattern"].compiled()
+
+        def warm():
+            PromptThreatDetector(RulePack(path, cache_dir=cache_dir))
+
+        cold_time = measure(cold, args.rounds)
+        PromptThreatDetector(RulePack(path, cache_dir=cache_dir))
+        warm_time = measure(warm, args.rounds)
+        detector = PromptThreatDetector(RulePack(path, cache_dir=cache_dir))
+        print(
+            f"规则包：{len(detector.regex_signatures)} 条正则，{len(detector.keyword_weights)} 个特征词，"
+            f"自动机 {detector._literal_matcher.state_count} 个状态，版本 {detector.rule_pack.version}"
+        )
+        print(f"  全量编译（无工件）：{cold_time * 1000:10.2f} ms")
+        print(f"  加载编译工件      ：{warm_time * 1000:10.2f} ms")
+        print(f"  加速比            ：{cold_time / warm_time:.2f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+正则特征集基准：对比逐条 search 与 SignatureSet 锚点预筛在良性群聊语料上的耗时。
+
+用法：python benchmarks/bench_signatures.py [--count 5000] [--rounds 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import benign_messages  # noqa: E402
+from ptd_core import PromptThreatDetector  # noqa: E402
+from ptd_matchers import anchor_text  # noqa: E402
+
+
+def run_naive(detector, messages):
+    hits = 0
+    for text in messages:
+        for signature in detector.regex_signatures:
+            if signature["pattern"].search(text):
+                hits += 1
+    return hits
+
+
+def run_signature_set(detector, messages):
+    hits = 0
+    signature_set = detector.signature_set
+    for text in messages:
+        hits += len(signature_set.search(text, anchor_text(text, text.lower())))
+    return hits
+
+
+def measure(func, detector, messages, rounds):
+    best = float("inf")
+    result = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func(detector, messages)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    detector = PromptThreatDetector()
+    signature_set = detector.signature_set
+    short_messages = benign_messages(args.count)
+    long_messages = ["\n".join(short_messages[i : i + 50]) for i in range(0, len(short_messages), 50)]
+    print(f"{len(detector.regex_signatures)} 条正则特征，锚点覆盖 {signature_set.anchored_count} 条")
+
+    for label, messages in (("良性短消息", short_messages), ("良性长消息(50 条拼接)", long_messages)):
+        candidates = sum(len(signature_set.candidates(text.lower())) for text in messages)
+        naive_time, naive_hits = measure(run_naive, detector, messages, args.rounds)
+        fused_time, fused_hits = measure(run_signature_set, detector, messages, args.rounds)
+        if naive_hits != fused_hits:
+            raise SystemExit(f"结果不一致：naive={naive_hits} signature_set={fused_hits}")
+        per_naive = naive_time / len(messages) * 1e6
+        per_fused = fused_time / len(messages) * 1e6
+        print(f"[{label}] {len(messages)} 条，平均候选正则 {candidates / len(messages):.2f} 条/消息")
+        print(f"  逐条 search  ：{per_naive:10.2f} µs/消息")
+        print(f"  SignatureSet ：{per_fused:10.2f} µs/消息")
+        print(f"  加速比       ：{per_naive / per_fused:.2f}x")
+
+if __name__ == "__main__":
+    main()
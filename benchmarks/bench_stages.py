@@ -0,0 +1,130 @@
+"""
+分析阶段基准：统计良性 / 攻击语料下各阶段的单条耗时，并对比仇恨兜底正则、严格仇恨请求正则、
+外链提取三处「调用时内联 re.search / re.finditer」旧写法与预编译合并写法的单次调用开销。
+
+用法：python benchmarks/bench_stages.py [--count 2000] [--rounds 5]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import attack_messages, benign_messages  # noqa: E402
+from ptd_core import PromptThreatDetector  # noqa: E402
+from ptd_normalize import normalize_text  # noqa: E402
+
+# 旧实现中每个兜底正则作用的文本：True 为 normalized，False 为原文
+LEGACY_USE_NORMALIZED = {
+    "pattern-en-group",
+    "pattern-en-incite",
+    "pattern-en-emotion",
+    "pattern-en-request",
+}
+
+
+def legacy_hate_fallback(detector, category, text, normalized):
+    for label, pattern in detector.HATE_FALLBACK_PATTERNS[category]:
+        if re.search(pattern, normalized if label in LEGACY_USE_NORMALIZED else text):
+            return label
+    return None
+
+
+def legacy_hate_request(detector, text, normalized):
+    for pattern in detector.hate_request_patterns:
+        match = pattern.search(text)
+        if not match:
+            match = pattern.search(normalized)
+        if match:
+            return match.group(0)
+    return None
+
+
+def legacy_links(detector, text):
+    links = []
+    for link in re.findall(r"https?://[^\s]+", text):
+        lowered = link.lower()
+        if any(domain in lowered for domain in detector.malicious_domains):
+            links.append(link)
+    return links
+
+
+def legacy_round(detector, prepared):
+    results = []
+    for text, normalized in prepared:
+        fallbacks = tuple(
+            legacy_hate_fallback(detector, category, text, normalized) for category in detector.HATE_FALLBACK_PATTERNS
+        )
+        results.append((fallbacks, legacy_hate_request(detector, text, normalized), legacy_links(detector, text)))
+    return results
+
+
+def compiled_round(detector, prepared):
+    results = []
+    for text, normalized in prepared:
+        fallbacks = tuple(detector._match_hate_fallback(category, normalized) for category in detector.HATE_FALLBACK_PATTERNS)
+        request = detector._match_hate_request_patterns(text, normalized)
+        links = [text[start:end] for start, end in detector._iter_suspicious_links(normalized)]
+        results.append((fallbacks, request["detail"] if request else None, links))
+    return results
+
+
+def measure(func, detector, prepared, rounds):
+    best = float("inf")
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func(detector, prepared)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report_stages(detector, label, messages, rounds):
+    totals = {}
+    for _ in range(rounds):
+        for text in messages:
+            for stage, seconds in detector.profile_stages(text).items():
+                totals[stage] = totals.get(stage, 0.0) + seconds
+    calls = len(messages) * rounds
+    print(f"{label}：{len(messages)} 条消息，各阶段平均耗时")
+    for stage, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"  {stage:<14}{seconds / calls * 1e6:10.2f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    detector = PromptThreatDetector()
+    corpora = [
+        ("良性语料", benign_messages(args.count)),
+        ("攻击语料", attack_messages(max(1, args.count // 4))),
+    ]
+    for label, messages in corpora:
+        report_stages(detector, label, messages, args.rounds)
+
+    for label, messages in corpora:
+        prepared = [normalize_text(text) for text in messages]
+        legacy_time, legacy_result = measure(legacy_round, detector, prepared, args.rounds)
+        compiled_time, compiled_result = measure(compiled_round, detector, prepared, args.rounds)
+        # 旧实现返回的严格匹配片段来自原文或 normalized，这里只比较是否命中
+        mismatches = sum(
+            1
+            for old, new in zip(legacy_result, compiled_result)
+            if old[0] != new[0] or (old[1] is None) != (new[1] is None) or old[2] != new[2]
+        )
+        per_call = 1e6 / len(messages)
+        print(f"{label}：仇恨兜底 + 严格请求正则 + 外链提取")
+        print(f"  内联 re 调用：{legacy_time * per_call:8.2f} µs/条")
+        print(f"  预编译合并  ：{compiled_time * per_call:8.2f} µs/条")
+        print(f"  单次节省    ：{(legacy_time - compiled_time) * per_call:8.2f} µs/条（{legacy_time / compiled_time:.2f}x）")
+        print(f"  结果不一致  ：{mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+PTD 综合基准：在多种消息规模与攻击组合下测量 analyze 的吞吐、p50 / p99 延迟与单次调用的内存分配，
+结果可保存为 JSON 基线，并与其他版本（或其他规则包）的基线逐项对比。
+
+场景：
+- benign_short      日常短句（中英混杂、表情、@）
+- benign_long       数百到上千字符的日常叙述
+- attack_mix        注入 / 越狱 / 仇恨 / 外链模板样本
+- family:<家族>      每类信号的命中样本（正则、特征词、结构标记、越狱语句、仇恨、代码块、外链、编码载荷）
+- adversarial_long  近似命中片段、诱饵编码与超长文本组成的对抗输入（走分窗分析）
+
+用法：
+  python benchmarks/bench_suite.py [--count 2000] [--rounds 3] [--fast] [--rule-pack PATH]
+  python benchmarks/bench_suite.py --output benchmarks/baselines/ptd-2.3.0.json
+  python benchmarks/bench_suite.py --compare benchmarks/baselines/ptd-2.3.0.json [--tolerance 0.1] [--fail-on-regression]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import (  # noqa: E402
+    adversarial_long_messages,
+    attack_messages,
+    benign_long_messages,
+    benign_messages,
+    signature_family_messages,
+)
+from ptd_core import PromptThreatDetector  # noqa: E402
+from ptd_rulepack import RulePack  # noqa: E402
+
+BASELINE_FORMAT = 1
+# 对比时视为“越大越差”的指标
+REGRESSION_METRICS = ("mean_us", "p50_us", "p99_us", "alloc_peak_mean", "alloc_peak_p99")
+
+
+def build_scenarios(detector, count, selected=None):
+    scenarios = {
+        "benign_short": benign_messages(count),
+        "benign_long": benign_long_messages(max(1, count // 4)),
+        "attack_mix": attack_messages(max(1, count // 4)),
+    }
+    for family, messages in signature_family_messages(detector, max(1, count // 20)).items():
+        scenarios[f"family:{family}"] = messages
+    scenarios["adversarial_long"] = adversarial_long_messages(max(4, count // 100))
+    if selected:
+        scenarios = {name: messages for name, messages in scenarios.items() if name in selected}
+    return scenarios
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def measure_latency(detector, messages, rounds, fast):
+    latencies = []
+    total = 0.0
+    for _ in range(rounds):
+        for text in messages:
+            start = time.perf_counter()
+            detector.analyze(text, fast=fast)
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            total += elapsed
+    return latencies, total
+
+
+def measure_allocations(detector, messages, fast):
+    """单独一轮 tracemalloc：记录每次调用的峰值分配字节数与调用结束后仍存活的内存块数。"""
+    peaks = []
+    retained = []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for text in messages:
+            before, _ = tracemalloc.get_traced_memory()
+            blocks_before = sys.getallocatedblocks()
+            tracemalloc.reset_peak()
+            result = detector.analyze(text, fast=fast)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(sys.getallocatedblocks() - blocks_before)
+            del result
+    finally:
+        tracemalloc.stop()
+    return peaks, retained
+
+
+def run_scenario(detector, messages, rounds, fast):
+    for text in messages[: min(len(messages), 50)]:
+        detector.analyze(text, fast=fast)
+    latencies, total = measure_latency(detector, messages, rounds, fast)
+    peaks, retained = measure_allocations(detector, messages, fast)
+    calls = len(latencies)
+    chars = sum(len(text) for text in messages) * rounds
+    return {
+        "messages": len(messages),
+        "avg_chars": round(chars / calls, 1),
+        "throughput_msgs": round(calls / total, 1),
+        "throughput_kchars": round(chars / total / 1000, 1),
+        "mean_us": round(total / calls * 1e6, 2),
+        "p50_us": round(percentile(latencies, 0.50) * 1e6, 2),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 2),
+        "max_us": round(max(latencies) * 1e6, 2),
+        "alloc_peak_mean": round(sum(peaks) / len(peaks), 1),
+        "alloc_peak_p99": percentile(peaks, 0.99),
+        "retained_blocks_mean": round(sum(retained) / len(retained), 2),
+    }
+
+
+def collect_meta(detector, args):
+    rule_pack = getattr(detector, "rule_pack", None)
+    return {
+        "format": BASELINE_FORMAT,
+        "ptd_version": detector.version,
+        "ruleset_version": detector.ruleset_version,
+        "rule_pack": rule_pack.name if rule_pack is not None else None,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "count": args.count,
+        "rounds": args.rounds,
+        "fast": args.fast,
+    }
+
+
+def print_results(results):
+    header = f"{'场景':<22}{'条数':>6}{'均长':>9}{'msg/s':>11}{'p50 µs':>10}{'p99 µs':>10}{'峰值分配 B':>12}{'存活块':>8}"
+    print(header)
+    for name, row in results.items():
+        print(
+            f"{name:<22}{row['messages']:>6}{row['avg_chars']:>9.0f}{row['throughput_msgs']:>11.0f}"
+            f"{row['p50_us']:>10.1f}{row['p99_us']:>10.1f}{row['alloc_peak_mean']:>12.0f}{row['retained_blocks_mean']:>8.1f}"
+        )
+
+
+def compare(baseline, current, tolerance):
+    """逐项对比基线，返回超出容差的退化项。"""
+    base_meta, meta = baseline.get("meta", {}), current["meta"]
+    print(
+        f"\n对比基线：PTD {base_meta.get('ptd_version')}（规则 {base_meta.get('ruleset_version')}，"
+        f"Python {base_meta.get('python')}） → PTD {meta['ptd_version']}（规则 {meta['ruleset_version']}，"
+        f"Python {meta['python']}）"
+    )
+    if base_meta.get("fast") != meta["fast"] or base_meta.get("count") != meta["count"]:
+        print("  注意：两次运行的 count / fast 参数不同，结果仅供参考")
+    regressions = []
+    for name, row in current["scenarios"].items():
+        base_row = baseline.get("scenarios", {}).get(name)
+        if base_row is None:
+            print(f"  {name:<22}基线中不存在该场景")
+            continue
+        deltas = []
+        for metric in REGRESSION_METRICS:
+            old, new = base_row.get(metric), row.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            deltas.append(f"{metric} {change:+.1%}")
+            if change > tolerance:
+                regressions.append(f"{name} {metric}: {old} → {new} ({change:+.1%})")
+        print(f"  {name:<22}" + "，".join(deltas))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000, help="日常短句条数，其余场景按比例缩放")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--fast", action="store_true", help="以快速判定模式运行 analyze")
+    parser.add_argument("--rule-pack", default="", help="使用指定规则包（默认内置规则包）")
+    parser.add_argument("--scenarios", default="", help="只运行指定场景，逗号分隔")
+    parser.add_argument("--output", default="", help="把结果保存为 JSON 基线")
+    parser.add_argument("--compare", default="", help="与已保存的 JSON 基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="对比时允许的退化比例")
+    parser.add_argument("--fail-on-regression", action="store_true", help="存在超出容差的退化时以非零状态退出")
+    args = parser.parse_args()
+
+    detector = PromptThreatDetector(RulePack(args.rule_pack)) if args.rule_pack else PromptThreatDetector()
+    selected = {name.strip() for name in args.scenarios.split(",") if name.strip()}
+    scenarios = build_scenarios(detector, args.count, selected)
+
+    results = {}
+    for name, messages in scenarios.items():
+        if messages:
+            results[name] = run_scenario(detector, messages, args.rounds, args.fast)
+    report = {"meta": collect_meta(detector, args), "scenarios": results}
+
+    print(f"PTD {detector.version}，规则集 {detector.ruleset_version}，{'快速判定' if args.fast else '完整分析'}")
+    print_results(results)
+
+    if args.output:
+        directory = os.path.dirname(os.path.abspath(args.output))
+        os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存：{args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\n超出容差（{args.tolerance:.0%}）的退化：")
+            for item in regressions:
+                print(f"  {item}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\n未发现超出容差的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+try:
+    from .ptd_metrics import RollingHistogram  # type: ignore
+except ImportError:
+    from ptd_metrics import RollingHistogram
+
+# LLM 调用延迟的直方图桶上界（秒）：100 ms ~ 60 s
+LLM_LATENCY_BOUNDS: Tuple[float, ...] = (
+    0.1,
+    0.2,
+    0.5,
+    1.0,
+    2.0,
+    5.0,
+    10.0,
+    20.0,
+    60.0,
+    float("inf"),
+)
+
+BatchRunner = Callable[[List[str]], Awaitable[List[Optional[Dict[str, Any]]]]]
+SingleRunner = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class AuditBatcher:
+    """
+    LLM 复核微批处理
+    --------------
+    - 没有复核在途时，新请求立即单独发送，不引入任何等待
+    - 已有复核在途（例如刷屏期间）时，新请求进入队列，等待 window 秒或凑满 max_batch 条后
+      合并为一次批量请求，结果按编号拆分回各个等待中的协程
+    - 批量结果中缺失或无法解析的条目回退为单条请求；批量请求本身抛出异常时，异常传给该批全部请求
+    - 记录批次数、批大小、回退次数，以及单条 / 批量调用的滚动延迟直方图与吞吐
+    """
+
+    def __init__(self, run_batch: BatchRunner, window: float = 0.05, max_batch: int = 8):
+        self.run_batch = run_batch
+        self.window = max(0.0, float(window))
+        self.max_batch = max(2, int(max_batch))
+        self._pending: List[Tuple[str, SingleRunner, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.in_flight = 0
+        self.singles = 0
+        self.batches = 0
+        self.batched_prompts = 0
+        self.max_batch_seen = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.single_latency = RollingHistogram(bounds=LLM_LATENCY_BOUNDS)
+        self.batch_latency = RollingHistogram(bounds=LLM_LATENCY_BOUNDS)
+        self.audited = RollingHistogram(bounds=LLM_LATENCY_BOUNDS)
+
+    async def submit(self, prompt: str, single: SingleRunner) -> Dict[str, Any]:
+        """提交一条待复核内容；single 为单条复核的回调，用于立即发送与批量解析失败时的回退。"""
+        started = time.monotonic()
+        try:
+            if self.in_flight == 0 and not self._pending:
+                return await self._run_single(single)
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((prompt, single, future))
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+            return await future
+        finally:
+            self.audited.record(time.monotonic() - started)
+
+    async def _run_single(self, single: SingleRunner) -> Dict[str, Any]:
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            return await single()
+        finally:
+            self.in_flight -= 1
+            self.singles += 1
+            self.single_latency.record(time.monotonic() - started)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            items, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch:]
+            task = asyncio.ensure_future(self._dispatch(items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, items: List[Tuple[str, SingleRunner, asyncio.Future]]) -> None:
+        live = [item for item in items if not item[2].done()]
+        if not live:
+            return
+        if len(live) == 1:
+            await self._settle(live[0][2], self._run_single(live[0][1]))
+            return
+        self.in_flight += 1
+        started = time.monotonic()
+        try:
+            results = await self.run_batch([prompt for prompt, _, _ in live])
+        except Exception as exc:
+            self.failures += 1
+            for _, _, future in live:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self.in_flight -= 1
+            self.batch_latency.record(time.monotonic() - started)
+        self.batches += 1
+        self.batched_prompts += len(live)
+        self.max_batch_seen = max(self.max_batch_seen, len(live))
+        retries = []
+        for index, (_, single, future) in enumerate(live):
+            result = results[index] if index < len(results) else None
+            if future.done():
+                continue
+            if result is None:
+                self.fallbacks += 1
+                retries.append(self._settle(future, self._run_single(single)))
+            else:
+                future.set_result(result)
+        if retries:
+            await asyncio.gather(*retries)
+
+    @staticmethod
+    async def _settle(future: asyncio.Future, call: Awaitable[Dict[str, Any]]) -> None:
+        try:
+            result = await call
+        except Exception as exc:
+            if not future.done():
+                future.set_exception(exc)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        audited = self.audited.snapshot()
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "in_flight": self.in_flight,
+            "queued": len(self._pending),
+            "singles": self.singles,
+            "batches": self.batches,
+            "batched_prompts": self.batched_prompts,
+            "avg_batch": (self.batched_prompts / self.batches) if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "throughput_per_min": audited["count"] * 60 / self.audited.window_seconds,
+            "audit_latency": audited,
+            "single_latency": self.single_latency.snapshot(),
+            "batch_latency": self.batch_latency.snapshot(),
+        }
+
+
+class CircuitBreaker:
+    """
+    LLM 复核熔断器
+    ------------
+    - closed：正常调用；最近 window 秒内调用数不少于 min_calls 且失败（异常 / 超时）或慢调用占比
+      达到 error_rate 时转为 open
+    - open：直接拒绝调用，插件退回纯启发式判定；cooldown 秒后转为 half_open
+    - half_open：只放行一个探测调用，成功则恢复 closed 并清空统计，失败则重新 open；
+      探测调用超过 cooldown 仍未返回结果时允许发起新的探测
+    - allow() 放行时返回调用凭据（递增整数），拒绝时返回 None；调用结束后以同一凭据调用 record()。
+      half_open 期间只采纳当前探测凭据的结果，熔断前发出、迟到的调用或已被替换的旧探测不会决定状态
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0.5,
+        slow_seconds: float = 5.0,
+        cooldown: float = 30.0,
+        window: float = 60.0,
+        min_calls: int = 5,
+    ):
+        self.error_rate = min(1.0, max(0.05, float(error_rate)))
+        self.slow_seconds = max(0.0, float(slow_seconds))
+        self.cooldown = max(1.0, float(cooldown))
+        self.window = max(1.0, float(window))
+        self.min_calls = max(1, int(min_calls))
+        self.state = "closed"
+        self._calls: "deque[Tuple[float, bool, bool]]" = deque()
+        self._opened_at = 0.0
+        self._probe_at: Optional[float] = None
+        self._probe_token: Optional[int] = None
+        self._tokens = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_trip: Optional[float] = None
+        self.last_reason = ""
+
+    def _prune(self, now: float) -> None:
+        while self._calls and self._calls[0][0] <= now - self.window:
+            self._calls.popleft()
+
+    def allow(self) -> Optional[int]:
+        now = time.monotonic()
+        if self.state == "open" and now - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+            self._probe_at = None
+        if self.state == "half_open":
+            if self._probe_at is None or now - self._probe_at >= self.cooldown:
+                self._probe_at = now
+                self._tokens += 1
+                self._probe_token = self._tokens
+                return self._probe_token
+        if self.state == "closed":
+            self._tokens += 1
+            return self._tokens
+        self.rejected += 1
+        return None
+
+    def record(self, success: bool, elapsed: float, token: Optional[int] = None) -> None:
+        now = time.monotonic()
+        slow = bool(self.slow_seconds) and elapsed >= self.slow_seconds
+        if self.state == "half_open":
+            if token is None or token != self._probe_token:
+                return
+            self._probe_token = None
+            if success and not slow:
+                self.state = "closed"
+                self._calls.clear()
+                self._probe_at = None
+            else:
+                self._trip(now, "探测调用失败" if not success else f"探测调用耗时 {elapsed:.1f} 秒")
+            return
+        if self.state == "open":
+            return
+        self._calls.append((now, success, slow))
+        self._prune(now)
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow_calls = sum(1 for _, ok, is_slow in self._calls if ok and is_slow)
+        total = len(self._calls)
+        if failures / total >= self.error_rate:
+            self._trip(now, f"最近 {total} 次调用失败 {failures} 次")
+        elif (failures + slow_calls) / total >= self.error_rate:
+            self._trip(now, f"最近 {total} 次调用中 {failures + slow_calls} 次失败或超过 {self.slow_seconds:g} 秒")
+
+    def _trip(self, now: float, reason: str) -> None:
+        self.state = "open"
+        self._opened_at = now
+        self._probe_at = None
+        self._probe_token = None
+        self._calls.clear()
+        self.trips += 1
+        self.last_trip = time.time()
+        self.last_reason = reason
+
+    def reset(self) -> None:
+        self.state = "closed"
+        self._calls.clear()
+        self._probe_at = None
+        self._probe_token = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._prune(now)
+        total = len(self._calls)
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = max(0.0, self.cooldown - (now - self._opened_at))
+        return {
+            "state": self.state,
+            "calls": total,
+            "failures": failures,
+            "error_rate": (failures / total) if total else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_in": retry_in,
+            "last_trip": self.last_trip,
+            "last_reason": self.last_reason,
+        }
+
+
+class AuditUnavailable(RuntimeError):
+    """熔断器处于打开状态，本次复核未发往模型。"""
+
+
+class SingleFlight:
+    """
+    在途请求合并（singleflight）
+    --------------------------
+    - 同一个键的调用在途时，后到的调用方直接等待首个调用的结果，不再重复发起
+    - 调用在独立任务中运行，任一等待方被取消（例如超过复核时限）不会影响其他等待方
+    - 结果或异常原样交给全部等待方；调用结束后键即释放，之后的调用重新发起
+    - saved 记录被合并、因而省下的调用次数，max_fanout 为单次调用的最大等待方数量
+    - reusable 判定结果能否共享：后到的调用方拿到不可共享的结果（例如超出时间预算而不完整的分析）时
+      自行重新发起调用，计入 reruns
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.calls = 0
+        self.saved = 0
+        self.reruns = 0
+        self.max_fanout = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        reusable: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            self._waiters[key] = 1
+            self.calls += 1
+            task.add_done_callback(lambda done, key=key: self._release(key, done))
+        else:
+            self._waiters[key] += 1
+            self.saved += 1
+            self.max_fanout = max(self.max_fanout, self._waiters[key])
+        result = await asyncio.shield(task)
+        if leader or reusable is None or reusable(result):
+            return result
+        self.saved -= 1
+        self.reruns += 1
+        return await factory()
+
+    def _release(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            self._waiters.pop(key, None)
+        if not task.cancelled():
+            # 所有等待方都已放弃时异常无人读取，这里读取一次以免事件循环告警
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.calls + self.saved
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "saved": self.saved,
+            "saved_rate": (self.saved / total) if total else 0.0,
+            "reruns": self.reruns,
+            "max_fanout": self.max_fanout,
+        }
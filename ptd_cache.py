@@ -0,0 +1,320 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.blake2b((prompt or "").encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _copy_analysis(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    copied = dict(analysis)
+    if isinstance(copied.get("signals"), list):
+        copied["signals"] = list(copied["signals"])
+    return copied
+
+
+class VerdictCache:
+    """
+    判定缓存（LRU + TTL）
+    --------------------
+    - 以「提示词摘要 + 规则集版本」为键缓存 PTD 启发式分析结果
+    - variant 用于区分同一提示词的不同分析方式（例如快速判定与完整分析）
+    - 可选缓存 LLM 复核结论，单独以「提示词摘要 + 模型标识 + 复核模板版本」为键：
+      更换模型或修改复核提示词即不再命中，规则集变化不影响仍然有效的复核结论
+    - 容量超限时淘汰最久未使用的条目，超过 TTL 的条目在读取时丢弃
+    - 规则集版本变化时启发式结果整体失效，避免旧规则的判定被复用
+    """
+
+    def __init__(self, capacity: int = 2048, ttl: float = 600.0):
+        self.capacity = max(1, int(capacity))
+        self.ttl = max(1.0, float(ttl))
+        self._entries: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._llm_entries: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.llm_hits = 0
+        self.llm_misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _sync_version(self, version: str) -> None:
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def _lookup(self, prompt: str, version: str, variant: str = "") -> Tuple[str, Optional[List[Any]]]:
+        self._sync_version(version)
+        key = f"{variant}:{prompt_digest(prompt)}" if variant else prompt_digest(prompt)
+        entry = self._entries.get(key)
+        if entry is None:
+            return key, None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return key, None
+        self._entries.move_to_end(key)
+        return key, entry
+
+    def _store(self, key: str) -> List[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = [0.0, None]
+            self._entries[key] = entry
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._entries.move_to_end(key)
+        entry[0] = time.monotonic() + self.ttl
+        return entry
+
+    def get(self, prompt: str, version: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        _, entry = self._lookup(prompt, version, variant)
+        if entry is None or entry[1] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _copy_analysis(entry[1])
+
+    def put(self, prompt: str, version: str, analysis: Dict[str, Any], variant: str = "") -> None:
+        key, _ = self._lookup(prompt, version, variant)
+        self._store(key)[1] = _copy_analysis(analysis)
+
+    @staticmethod
+    def _llm_key(prompt: str, model: str, template: str) -> str:
+        return f"{model}\x00{template}\x00{prompt_digest(prompt)}"
+
+    def get_llm(self, prompt: str, model: str, template: str) -> Optional[Dict[str, Any]]:
+        key = self._llm_key(prompt, model, template)
+        entry = self._llm_entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._llm_entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.llm_misses += 1
+            return None
+        self._llm_entries.move_to_end(key)
+        self.llm_hits += 1
+        return dict(entry[1])
+
+    def put_llm(self, prompt: str, model: str, template: str, result: Dict[str, Any]) -> None:
+        key = self._llm_key(prompt, model, template)
+        self._llm_entries[key] = [time.monotonic() + self.ttl, dict(result)]
+        self._llm_entries.move_to_end(key)
+        while len(self._llm_entries) > self.capacity:
+            self._llm_entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._llm_entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._llm_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "llm_size": len(self._llm_entries),
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "llm_hits": self.llm_hits,
+            "llm_misses": self.llm_misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "version": self._version or "",
+        }
+
+
+class PersistentLLMCache:
+    """
+    LLM 复核结论持久化缓存（SQLite）
+    ------------------------------
+    - 以「提示词摘要 + 模型标识 + 审计模板版本」为键保存 is_injection / confidence / reason，
+      更换模型或修改审计提示词后旧结论自然不再命中
+    - 启动时清理过期条目、按容量裁剪，并把剩余条目载入内存；查询只读内存，不加锁、不触碰磁盘
+    - 写入只在短暂持锁期间更新内存，随后把落盘任务放入队列，由唯一的写入线程持有数据库连接（WAL 模式）
+      批量执行并提交，磁盘较慢时也不会阻塞查询与事件循环；容量超限时按写入时间淘汰最旧的条目
+    - 数据库打开失败时退化为纯内存缓存，last_error 记录原因；close() 会等待队列中的写入全部落盘
+    """
+
+    # 写入线程单次提交最多合并的任务数
+    WRITE_BATCH = 256
+
+    def __init__(self, path: str, capacity: int = 20000, ttl: float = 86400.0):
+        self.path = os.path.abspath(path)
+        self.capacity = max(1, int(capacity))
+        self.ttl = max(1.0, float(ttl))
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._queue: "queue.Queue[Optional[Tuple[str, tuple]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.loaded = 0
+        self.last_error = ""
+        try:
+            self._open()
+        except (OSError, sqlite3.Error) as exc:
+            self.last_error = str(exc)
+            self._db = None
+        if self._db is not None:
+            self._writer = threading.Thread(target=self._write_loop, name="ptd-llm-cache", daemon=True)
+            self._writer.start()
+
+    def _open(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_verdicts ("
+            "digest TEXT NOT NULL, model TEXT NOT NULL, template TEXT NOT NULL, "
+            "is_injection INTEGER NOT NULL, confidence REAL NOT NULL, reason TEXT NOT NULL, "
+            "created REAL NOT NULL, PRIMARY KEY (digest, model, template))"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS llm_verdicts_created ON llm_verdicts (created)")
+        now = time.time()
+        db.execute("DELETE FROM llm_verdicts WHERE created <= ?", (now - self.ttl,))
+        rows = db.execute(
+            "SELECT digest, model, template, is_injection, confidence, reason, created "
+            "FROM llm_verdicts ORDER BY created DESC LIMIT ?",
+            (self.capacity,),
+        ).fetchall()
+        if rows and len(rows) == self.capacity:
+            db.execute("DELETE FROM llm_verdicts WHERE created < ?", (rows[-1][6],))
+        db.commit()
+        monotonic_offset = time.monotonic() - now
+        for digest, model, template, is_injection, confidence, reason, created in reversed(rows):
+            result = {"is_injection": bool(is_injection), "confidence": float(confidence), "reason": reason}
+            self._entries[(digest, model, template)] = (created + self.ttl + monotonic_offset, result)
+        self.loaded = len(self._entries)
+        self._db = db
+
+    def _write_loop(self) -> None:
+        """写入线程：独占数据库连接，把队列中的任务合并为一次提交。"""
+        db = self._db
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for task in batch:
+                    if task is None:
+                        running = False
+                        break
+                    op, args = task
+                    if op == "put":
+                        row, evicted = args
+                        db.execute("INSERT OR REPLACE INTO llm_verdicts VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                        if evicted:
+                            db.executemany(
+                                "DELETE FROM llm_verdicts WHERE digest = ? AND model = ? AND template = ?", evicted
+                            )
+                    elif op == "clear":
+                        db.execute("DELETE FROM llm_verdicts")
+                db.commit()
+            except sqlite3.Error as exc:
+                self.last_error = str(exc)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        db.close()
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def get(self, prompt: str, model: str, template: str) -> Optional[Dict[str, Any]]:
+        key = (prompt_digest(prompt), model, template)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, prompt: str, model: str, template: str, result: Dict[str, Any]) -> None:
+        """写入一条结论：只更新内存并排队，落盘由写入线程完成。"""
+        key = (prompt_digest(prompt), model, template)
+        stored = {
+            "is_injection": bool(result.get("is_injection")),
+            "confidence": float(result.get("confidence", 0.0)),
+            "reason": str(result.get("reason") or ""),
+        }
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, stored)
+            evicted = []
+            while len(self._entries) > self.capacity:
+                evicted.append(self._entries.popitem(last=False)[0])
+                self.evictions += 1
+            self.writes += 1
+        if self._writer is not None:
+            row = (*key, int(stored["is_injection"]), stored["confidence"], stored["reason"], now)
+            self._queue.put(("put", (row, evicted)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._writer is not None:
+            self._queue.put(("clear", ()))
+
+    def flush(self) -> None:
+        """等待已排队的写入全部提交。"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
+            self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "writes": self.writes,
+            "pending_writes": self._queue.unfinished_tasks,
+            "evictions": self.evictions,
+            "loaded": self.loaded,
+            "persistent": self.persistent,
+            "path": self.path,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,408 @@
+"""
+本地统计分类器：介于启发式规则与 LLM 复核之间的一层。
+
+- 特征：规范化文本的字符 1~3-gram 哈希（二值、按 L2 归一化）与 analyze 产生的信号 / 等级 / 分数段
+- 模型：逻辑回归；推理只做稀疏点积与一次 sigmoid，纯 Python 即可在数十微秒内完成（短消息约 30 µs）
+- 训练：离线进行，依赖 NumPy（仅训练需要）；样本来自插件记录的带标签样本日志（JSONL）
+
+训练用法：python ptd_classifier.py --samples data/plugin_data/antipromptinjector/classifier_samples.jsonl \\
+          --output data/plugin_data/antipromptinjector/classifier.json [--rule-pack PATH] [--epochs 200]
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from .ptd_cache import prompt_digest  # type: ignore
+    from .ptd_normalize import normalize_text  # type: ignore
+except ImportError:
+    from ptd_cache import prompt_digest
+    from ptd_normalize import normalize_text
+
+try:
+    import numpy as np
+except ImportError:  # 推理不需要 NumPy，只有训练时才检查
+    np = None
+
+MODEL_FORMAT = "ptd-classifier"
+MODEL_VERSION = 1
+DEFAULT_FEATURE_BITS = 18
+NGRAM_SIZES: Tuple[int, ...] = (1, 2, 3)
+# 参与 n-gram 的最大字符数：注入意图通常出现在开头，超长文本的尾部只增加开销
+MAX_CLASSIFIER_CHARS = 1024
+# 样本来源优先级：同一文本出现多次时，人工标注覆盖 LLM 结论，LLM 结论覆盖规则拦截
+SOURCE_PRIORITY = {"manual": 3, "llm": 2}
+
+_SPACES = re.compile(r"\s+")
+
+
+def extract_features(
+    text: str, analysis: Optional[Dict[str, Any]] = None, feature_bits: int = DEFAULT_FEATURE_BITS
+) -> Dict[int, float]:
+    """
+    返回稀疏特征 {哈希下标: 取值}
+    - 文本 n-gram 为二值特征，整体按 L2 归一化，长短消息处于同一尺度
+    - 信号特征以 \\x00 开头，与文本 n-gram 不会产生相同的哈希输入
+    """
+    mask = (1 << feature_bits) - 1
+    folded = _SPACES.sub(" ", normalize_text(text or "")[1]).strip()[:MAX_CLASSIFIER_CHARS]
+    # 整段编码为定长 UTF-32 后按字节切片取 n-gram，避免逐个 n-gram 编码
+    data = folded.encode("utf-32-le", "surrogatepass")
+    grams = {
+        data[index * 4:(index + size) * 4]
+        for size in NGRAM_SIZES
+        for index in range(len(folded) - size + 1)
+    }
+    features: Dict[int, float] = {}
+    if grams:
+        value = 1.0 / math.sqrt(len(grams))
+        crc32 = zlib.crc32
+        for gram in grams:
+            slot = crc32(gram) & mask
+            features[slot] = features.get(slot, 0.0) + value
+    if analysis:
+        tokens = [f"\x00sev:{analysis.get('severity', 'none')}"]
+        tokens.append(f"\x00score:{min(int(analysis.get('score', 0) or 0), 200) // 20}")
+        if analysis.get("regex_hit"):
+            tokens.append("\x00regex")
+        for signal in analysis.get("signals") or ():
+            try:
+                tokens.append(f"\x00sig:{signal['type']}:{signal['name']}")
+            except (KeyError, TypeError):
+                continue
+        for token in tokens:
+            slot = zlib.crc32(token.encode("utf-8", "surrogatepass")) & mask
+            features[slot] = features.get(slot, 0.0) + 1.0
+    return features
+
+
+def _sigmoid(value: float) -> float:
+    if value >= 0:
+        return 1.0 / (1.0 + math.exp(-value))
+    exp = math.exp(value)
+    return exp / (1.0 + exp)
+
+
+class StatClassifier:
+    """
+    逻辑回归分类器
+    --------------
+    - predict 返回注入概率；权重以稀疏字典保存，只有训练中出现过的特征才占用内存
+    - 模型文件为 JSON：格式标识、特征位数、n-gram 配置、偏置、非零权重（下标 / 取值两个数组）与训练信息
+    """
+
+    def __init__(
+        self,
+        weights: Dict[int, float],
+        bias: float,
+        feature_bits: int = DEFAULT_FEATURE_BITS,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        self.weights = weights
+        self.bias = bias
+        self.feature_bits = feature_bits
+        self.meta = meta or {}
+        self.path = ""
+
+    def score(self, features: Dict[int, float]) -> float:
+        weights = self.weights
+        total = self.bias
+        for index, value in features.items():
+            weight = weights.get(index)
+            if weight is not None:
+                total += weight * value
+        return _sigmoid(total)
+
+    def predict(self, text: str, analysis: Optional[Dict[str, Any]] = None) -> float:
+        return self.score(extract_features(text, analysis, self.feature_bits))
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.weights.items())
+        return {
+            "format": MODEL_FORMAT,
+            "version": MODEL_VERSION,
+            "feature_bits": self.feature_bits,
+            "ngram_sizes": list(NGRAM_SIZES),
+            "max_chars": MAX_CLASSIFIER_CHARS,
+            "bias": self.bias,
+            "indices": [index for index, _ in ordered],
+            "values": [round(value, 6) for _, value in ordered],
+            "meta": self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StatClassifier":
+        if data.get("format") != MODEL_FORMAT or data.get("version") != MODEL_VERSION:
+            raise ValueError(f"不支持的分类器模型格式：{data.get('format')} v{data.get('version')}")
+        if list(data.get("ngram_sizes") or []) != list(NGRAM_SIZES) or data.get("max_chars") != MAX_CLASSIFIER_CHARS:
+            raise ValueError("分类器模型的特征配置与当前版本不一致，请重新训练")
+        indices = data.get("indices") or []
+        values = data.get("values") or []
+        if len(indices) != len(values):
+            raise ValueError("分类器模型权重数组长度不一致")
+        weights = {int(index): float(value) for index, value in zip(indices, values)}
+        feature_bits = int(data.get("feature_bits", DEFAULT_FEATURE_BITS))
+        return cls(weights, float(data.get("bias", 0.0)), feature_bits, data.get("meta"))
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as handle:
+                json.dump(self.to_dict(), handle, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str) -> "StatClassifier":
+        with open(path, encoding="utf-8") as handle:
+            classifier = cls.from_dict(json.load(handle))
+        classifier.path = path
+        return classifier
+
+
+class SampleLog:
+    """
+    带标签样本日志（JSONL，追加写入）
+    每行 {"time", "label", "source", "text"}：label 为 1 表示注入；source 为 llm（复核结论）、
+    regex / heuristic（规则拦截）或 manual（人工标注，可直接编辑文件追加）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self.last_error = ""
+        self._handle = None
+
+    def append(self, text: str, label: bool, source: str) -> bool:
+        line = json.dumps(
+            {"time": round(time.time(), 3), "label": int(bool(label)), "source": source, "text": text},
+            ensure_ascii=False,
+        )
+        try:
+            if self._handle is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._handle = open(self.path, "a", encoding="utf-8")
+            self._handle.write(line + "\n")
+            self._handle.flush()
+        except OSError as exc:
+            self.last_error = str(exc)
+            return False
+        self.written += 1
+        return True
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def read_samples(paths: Sequence[str]) -> Iterator[Tuple[str, int, str]]:
+    """逐行读取样本日志，跳过无法解析或缺少字段的行，返回 (文本, 标签, 来源)。"""
+    for path in paths:
+        with open(path, encoding="utf-8", errors="ignore") as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    text = record["text"]
+                    label = int(record["label"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if isinstance(text, str) and text.strip() and label in (0, 1):
+                    yield text, label, str(record.get("source") or "")
+
+
+def dedupe_samples(samples: Iterable[Tuple[str, int, str]]) -> List[Tuple[str, int, str]]:
+    """同一文本只保留一条：来源优先级高者胜出，同级时以最后一条为准。"""
+    chosen: Dict[str, Tuple[str, int, str]] = {}
+    for text, label, source in samples:
+        digest = prompt_digest(text)
+        current = chosen.get(digest)
+        if current is None or SOURCE_PRIORITY.get(source, 1) >= SOURCE_PRIORITY.get(current[2], 1):
+            chosen[digest] = (text, label, source)
+    return list(chosen.values())
+
+
+def fit_logistic(
+    rows: Sequence[Dict[int, float]],
+    labels: Sequence[int],
+    feature_bits: int = DEFAULT_FEATURE_BITS,
+    epochs: int = 200,
+    learning_rate: float = 0.5,
+    l2: float = 1e-4,
+) -> Tuple[Dict[int, float], float]:
+    """
+    全批量 AdaGrad 训练带 L2 正则的逻辑回归（NumPy 向量化，稀疏行展开为下标 / 取值数组）。
+    正负样本按数量反比加权，少数类不会被淹没。返回 (非零权重, 偏置)。
+    """
+    if np is None:
+        raise RuntimeError("训练分类器需要 NumPy：pip install numpy")
+    count = len(rows)
+    positives = sum(1 for label in labels if label)
+    if count == 0 or positives in (0, count):
+        raise ValueError("训练样本需要同时包含注入与正常两类")
+    lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=count)
+    row_ids = np.repeat(np.arange(count), lengths)
+    indices = np.fromiter((index for row in rows for index in row), dtype=np.int64, count=int(lengths.sum()))
+    values = np.fromiter((value for row in rows for value in row.values()), dtype=np.float64, count=int(lengths.sum()))
+    target = np.asarray(labels, dtype=np.float64)
+    sample_weight = np.where(target > 0, count / (2.0 * positives), count / (2.0 * (count - positives)))
+
+    dimension = 1 << feature_bits
+    weights = np.zeros(dimension)
+    bias = 0.0
+    squared = np.full(dimension, 1e-8)
+    bias_squared = 1e-8
+    for _ in range(max(1, int(epochs))):
+        margin = np.bincount(row_ids, weights=weights[indices] * values, minlength=count) + bias
+        error = (1.0 / (1.0 + np.exp(-margin)) - target) * sample_weight
+        gradient = np.bincount(indices, weights=values * error[row_ids], minlength=dimension) / count + l2 * weights
+        bias_gradient = float(error.mean())
+        squared += gradient * gradient
+        weights -= learning_rate * gradient / np.sqrt(squared)
+        bias_squared += bias_gradient * bias_gradient
+        bias -= learning_rate * bias_gradient / math.sqrt(bias_squared)
+    nonzero = np.flatnonzero(np.abs(weights) >= 1e-6)
+    return {int(index): float(weights[index]) for index in nonzero}, float(bias)
+
+
+def evaluate(
+    classifier: StatClassifier, rows: Sequence[Dict[int, float]], labels: Sequence[int], low: float, high: float
+) -> Dict[str, Any]:
+    """在留出集上统计 0.5 阈值的准确率 / 精确率 / 召回率，以及 [low, high] 区间外本地判定的覆盖率与错误数。"""
+    tp = fp = fn = tn = 0
+    settled = settled_errors = 0
+    for row, label in zip(rows, labels):
+        probability = classifier.score(row)
+        predicted = probability >= 0.5
+        if predicted and label:
+            tp += 1
+        elif predicted:
+            fp += 1
+        elif label:
+            fn += 1
+        else:
+            tn += 1
+        if probability <= low or probability >= high:
+            settled += 1
+            if (probability >= high) != bool(label):
+                settled_errors += 1
+    total = len(labels)
+    return {
+        "samples": total,
+        "accuracy": (tp + tn) / total if total else 0.0,
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+        "settled": settled / total if total else 0.0,
+        "settled_errors": settled_errors,
+        "low": low,
+        "high": high,
+    }
+
+
+def train_classifier(
+    samples: Sequence[Tuple[str, int, str]],
+    detector: Any = None,
+    feature_bits: int = DEFAULT_FEATURE_BITS,
+    epochs: int = 200,
+    holdout: float = 0.2,
+    low: float = 0.1,
+    high: float = 0.9,
+) -> StatClassifier:
+    """
+    用样本训练分类器；传入 detector 时先用 analyze 生成信号特征（与线上推理一致）。
+    按文本摘要划分留出集（同一文本总落在同一侧），评估后用全部样本重新训练。
+    """
+    rows: List[Dict[int, float]] = []
+    labels: List[int] = []
+    heldout: List[bool] = []
+    for text, label, _ in samples:
+        analysis = detector.analyze(text) if detector is not None else None
+        rows.append(extract_features(text, analysis, feature_bits))
+        labels.append(label)
+        heldout.append(int(prompt_digest(text)[:8], 16) / 0xFFFFFFFF < holdout)
+    metrics: Dict[str, Any] = {}
+    train_rows = [row for row, held in zip(rows, heldout) if not held]
+    train_labels = [label for label, held in zip(labels, heldout) if not held]
+    test_rows = [row for row, held in zip(rows, heldout) if held]
+    test_labels = [label for label, held in zip(labels, heldout) if held]
+    if holdout > 0 and test_rows and 0 < sum(train_labels) < len(train_labels):
+        weights, bias = fit_logistic(train_rows, train_labels, feature_bits, epochs)
+        metrics = evaluate(StatClassifier(weights, bias, feature_bits), test_rows, test_labels, low, high)
+    weights, bias = fit_logistic(rows, labels, feature_bits, epochs)
+    meta = {
+        "trained_at": time.time(),
+        "samples": len(labels),
+        "positives": sum(labels),
+        "epochs": epochs,
+        "ruleset_version": getattr(detector, "ruleset_version", ""),
+        "holdout": metrics,
+    }
+    return StatClassifier(weights, bias, feature_bits, meta)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="用带标签样本日志训练本地注入分类器")
+    parser.add_argument("--samples", nargs="+", required=True, help="样本日志（JSONL），可指定多个")
+    parser.add_argument("--output", required=True, help="模型输出路径（JSON）")
+    parser.add_argument("--rule-pack", default="", help="生成信号特征所用的规则包，默认内置规则包")
+    parser.add_argument("--no-signals", action="store_true", help="只使用文本 n-gram 特征")
+    parser.add_argument("--feature-bits", type=int, default=DEFAULT_FEATURE_BITS)
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--holdout", type=float, default=0.2, help="留出评估的样本比例，0 表示不评估")
+    parser.add_argument("--low", type=float, default=0.1, help="评估用的安全阈值")
+    parser.add_argument("--high", type=float, default=0.9, help="评估用的风险阈值")
+    args = parser.parse_args(argv)
+
+    samples = dedupe_samples(read_samples(args.samples))
+    positives = sum(label for _, label, _ in samples)
+    print(f"样本：{len(samples)} 条（注入 {positives}，正常 {len(samples) - positives}）")
+    detector = None
+    if not args.no_signals:
+        try:
+            from .ptd_core import PromptThreatDetector  # type: ignore
+            from .ptd_rulepack import RulePack  # type: ignore
+        except ImportError:
+            from ptd_core import PromptThreatDetector
+            from ptd_rulepack import RulePack
+        detector = PromptThreatDetector(RulePack(args.rule_pack) if args.rule_pack else None)
+    try:
+        classifier = train_classifier(
+            samples, detector, args.feature_bits, args.epochs, args.holdout, args.low, args.high
+        )
+    except (RuntimeError, ValueError) as exc:
+        print(f"训练失败：{exc}", file=sys.stderr)
+        return 1
+    holdout = classifier.meta.get("holdout") or {}
+    if holdout:
+        print(
+            f"留出集 {holdout['samples']} 条：准确率 {holdout['accuracy']:.1%}，精确率 {holdout['precision']:.1%}，"
+            f"召回率 {holdout['recall']:.1%}"
+        )
+        print(
+            f"  阈值 {args.low:g} / {args.high:g}：本地判定 {holdout['settled']:.1%}，其中错误 {holdout['settled_errors']} 条"
+        )
+    classifier.save(args.output)
+    print(f"模型已写入 {args.output}（非零权重 {len(classifier.weights)} 个）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .ptd_cache import prompt_digest  # type: ignore
+except ImportError:
+    from ptd_cache import prompt_digest
+
+# 不参与扫描的上下文角色：模型自己的回复常复述被拒绝的请求，扫描只会制造误报
+SKIPPED_ROLES = frozenset({"assistant"})
+SYSTEM_PROMPT_ROLE = "system_prompt"
+
+
+def _content_text(content: Any) -> str:
+    """上下文条目的 content 可以是字符串，也可以是 OpenAI 风格的多段内容列表。"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, str):
+                parts.append(part)
+            elif isinstance(part, dict) and isinstance(part.get("text"), str):
+                parts.append(part["text"])
+        return "\n".join(parts)
+    return ""
+
+
+def extract_context_entries(
+    contexts: Optional[Iterable[Any]], depth: int, system_prompt: str = ""
+) -> List[Tuple[int, str, str]]:
+    """
+    从 ProviderRequest 中取出需要扫描的条目，返回 (位置, 角色, 文本)
+    - 只取最近 depth 条上下文，跳过模型回复与空内容；位置从 0 开始，以便展示
+    - system_prompt 非空时作为位置 -1 的条目附加在末尾
+    """
+    entries: List[Tuple[int, str, str]] = []
+    items = list(contexts or [])
+    start = max(0, len(items) - max(0, int(depth)))
+    for position in range(start, len(items)):
+        item = items[position]
+        if not isinstance(item, dict):
+            continue
+        role = str(item.get("role") or "user")
+        if role in SKIPPED_ROLES:
+            continue
+        text = _content_text(item.get("content"))
+        if text.strip():
+            entries.append((position, role, text))
+    if system_prompt and system_prompt.strip():
+        entries.append((-1, SYSTEM_PROMPT_ROLE, system_prompt))
+    return entries
+
+
+class ContextVerdict:
+    """单个上下文条目的扫描结论，只保留评分所需的字段。"""
+
+    __slots__ = ("score", "severity", "reason")
+
+    def __init__(self, score: int, severity: str, reason: str):
+        self.score = score
+        self.severity = severity
+        self.reason = reason
+
+
+class ContextScanStore:
+    """
+    会话上下文增量扫描缓存
+    --------------------
+    - 每个会话记录已扫描条目的摘要（角色 + 内容）与结论，新请求只需分析新增的条目，
+      多轮对话的总扫描量与历史长度呈线性而非平方关系
+    - 每个会话只保留最近一次请求中仍然存在的条目，历史被截断后相应结论随之释放
+    - 会话数超过上限时淘汰最久未活动的会话；规则集版本变化时整体失效
+    """
+
+    def __init__(self, max_sessions: int = 512, max_entries: int = 64):
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_entries = max(1, int(max_entries))
+        self._sessions: "OrderedDict[str, Dict[str, ContextVerdict]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self.scanned = 0
+        self.reused = 0
+        self.evictions = 0
+
+    def _sync_version(self, version: str) -> None:
+        if version != self._version:
+            self._sessions.clear()
+            self._version = version
+
+    def begin(self, session_id: str, entries: List[Tuple[int, str, str]], version: str) -> List[List[Any]]:
+        """
+        按摘要比对会话记录，返回与 entries 一一对应的 [位置, 角色, 文本, 摘要, 结论]；
+        结论为 None 的条目尚未分析，调用方分析后通过 record 写回。
+        会话记录只保留本次请求中仍然存在的条目。
+        """
+        self._sync_version(version)
+        previous = self._sessions.pop(session_id, None) or {}
+        current: Dict[str, ContextVerdict] = {}
+        rows: List[List[Any]] = []
+        for position, role, text in entries:
+            digest = prompt_digest(f"{role}\x00{text}")
+            verdict = previous.get(digest) or current.get(digest)
+            if verdict is not None:
+                current[digest] = verdict
+                self.reused += 1
+            rows.append([position, role, text, digest, verdict])
+        self._sessions[session_id] = current
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return rows
+
+    def record(self, session_id: str, digest: str, verdict: ContextVerdict) -> None:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        if len(session) >= self.max_entries and digest not in session:
+            session.pop(next(iter(session)))
+        session[digest] = verdict
+        self.scanned += 1
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "entries": sum(len(session) for session in self._sessions.values()),
+            "scanned": self.scanned,
+            "reused": self.reused,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,100 @@
+from typing import Any, Dict, Optional
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+# 载荷关键词（含大小写变体、三种字节对齐）编码后完全确定的 Base64 字符至少有 6 种
+_MIN_BASE64_SYMBOLS = 6
+
+
+def base64_reject_reason(chunk: str) -> Optional[str]:
+    """
+    按字符表直方图判断 Base64 候选片段是否值得解码，返回拒绝原因；None 表示需要解码。
+    以下三类片段解码后不可能包含载荷关键词，直接跳过：
+    - hex：只由十六进制字符组成（哈希、ID、颜色值）
+    - case：不含任何小写字母（常量名、全大写编号）
+    - repetitive：字符种类过少（重复字符、填充串）
+    判据均已对照各关键词在三种字节对齐下的编码形式核对，不会漏掉真实载荷；
+    不使用熵阈值，因为在载荷前后填充重复内容即可把整体熵压低。
+    """
+    symbols = set(chunk.rstrip("="))
+    if symbols <= _HEX_DIGITS:
+        return "hex"
+    if not any("a" <= symbol <= "z" for symbol in symbols):
+        return "case"
+    if len(symbols) < _MIN_BASE64_SYMBOLS:
+        return "repetitive"
+    return None
+
+
+def percent_reject_reason(encoded: str) -> Optional[str]:
+    """百分号编码片段：不同字节少于 4 种（如 %20%20%20…）时不可能包含载荷关键词。"""
+    if len(set(encoded.upper().split("%"))) - 1 < 4:
+        return "repetitive"
+    return None
+
+
+def unicode_escape_reject_reason(escaped: str) -> Optional[str]:
+    """Unicode 转义串：全部为同一个转义码时跳过。"""
+    if len(set(escaped.lower().split("\\u"))) - 1 < 2:
+        return "repetitive"
+    return None
+
+
+class DecodeBudget:
+    """
+    单条消息（分窗分析时为单个窗口）的载荷解码预算
+    ----------------------------------------------
+    - 限制解码次数与解码输入总字节数，超出预算的候选片段不再解码
+    - 记录候选数量、预筛拒绝（按原因）、预算跳过与实际解码量，随分析结果一并返回
+    """
+
+    __slots__ = (
+        "max_attempts",
+        "max_bytes",
+        "_window_attempts",
+        "_window_bytes",
+        "candidates",
+        "decoded",
+        "decoded_bytes",
+        "rejected",
+        "over_budget",
+    )
+
+    def __init__(self, max_attempts: int = 16, max_bytes: int = 16384):
+        self.max_attempts = max_attempts
+        self.max_bytes = max_bytes
+        self._window_attempts = 0
+        self._window_bytes = 0
+        self.candidates = 0
+        self.decoded = 0
+        self.decoded_bytes = 0
+        self.rejected: Dict[str, int] = {}
+        self.over_budget = 0
+
+    def admit(self, chunk: str, reason: Optional[str]) -> bool:
+        """登记一个候选片段；返回 True 表示应当解码。"""
+        self.candidates += 1
+        if reason is not None:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            return False
+        if self._window_attempts >= self.max_attempts or self._window_bytes + len(chunk) > self.max_bytes:
+            self.over_budget += 1
+            return False
+        self._window_attempts += 1
+        self._window_bytes += len(chunk)
+        self.decoded += 1
+        self.decoded_bytes += len(chunk)
+        return True
+
+    def renew(self) -> None:
+        """开始新窗口：恢复预算额度，计数保持累计。"""
+        self._window_attempts = 0
+        self._window_bytes = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "candidates": self.candidates,
+            "decoded": self.decoded,
+            "decoded_bytes": self.decoded_bytes,
+            "rejected": dict(self.rejected),
+            "over_budget": self.over_budget,
+        }
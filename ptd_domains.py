@@ -0,0 +1,285 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import zlib
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from .ptd_rulepack import ARTIFACT_DIR_NAME  # type: ignore
+except ImportError:
+    from ptd_rulepack import ARTIFACT_DIR_NAME
+
+TABLE_FORMAT = 1
+_TABLE_MAGIC = b"PTDDOM%02d" % TABLE_FORMAT
+_HEADER = struct.Struct("<8sIII")  # 魔数、槽位数、域名数、标签数
+_SLOT = struct.Struct("<III")  # crc32、键偏移、键长度（0 表示空槽）
+_LABEL_PREFIX = b"!"
+
+# 主机名只取 ASCII 字符：中文语境下链接后常紧跟汉字或全角标点，不能并入主机名；
+# 国际化域名在威胁情报中以 punycode（xn--）形式出现，同样落在该字符集内
+_URL_HOST = re.compile(r"https?://(?:[^\s/?#@]*@)?([a-z0-9_.\-]+)", re.IGNORECASE)
+_DOMAIN_CHARS = re.compile(r"[a-z0-9_.\-]+")
+_HOSTS_ADDRESSES = {"0.0.0.0", "127.0.0.1", "::", "::1"}
+
+
+def url_host(link: str) -> Optional[str]:
+    """提取链接的主机名（小写，去掉末尾的点）；跳过 user@ 前缀，避免 https://a.com@b.com 误判。"""
+    match = _URL_HOST.match(link)
+    if match is None:
+        return None
+    host = match.group(1).lower().strip(".")
+    return host or None
+
+
+def normalize_domain(entry: str) -> Optional[str]:
+    """
+    规范化黑名单条目，兼容纯域名、URL、hosts 文件行与 AdBlock 规则（||example.com^）。
+    不含点的条目（如 anonfiles）按主机名标签匹配；无法识别的条目返回 None。
+    """
+    entry = entry.split("#", 1)[0].strip().lower()
+    if not entry:
+        return None
+    parts = entry.split()
+    if len(parts) > 1 and parts[0] in _HOSTS_ADDRESSES:
+        entry = parts[1]
+    elif len(parts) > 1:
+        return None
+    if entry.startswith("||"):
+        entry = entry[2:]
+    entry = entry.rstrip("^")
+    if "://" in entry:
+        entry = entry.split("://", 1)[1]
+    entry = entry.split("/", 1)[0].split("@")[-1]
+    if entry.count(":") == 1:
+        entry = entry.split(":", 1)[0]
+    entry = entry.lstrip("*").strip(".")
+    if not entry.isascii():
+        try:
+            entry = entry.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    if not entry or _DOMAIN_CHARS.fullmatch(entry) is None or entry in _HOSTS_ADDRESSES:
+        return None
+    return entry
+
+
+def host_keys(host: str) -> Tuple[List[str], List[str]]:
+    """返回主机名的全部后缀（从完整主机名到二级域名）与全部标签，查询次数只与标签数有关。"""
+    suffixes = [host]
+    position = host.find(".")
+    while position != -1:
+        suffix = host[position + 1 :]
+        if "." not in suffix:
+            break
+        suffixes.append(suffix)
+        position = host.find(".", position + 1)
+    return suffixes, host.split(".")
+
+
+class DomainSet:
+    """
+    内存域名集合
+    ------------
+    - 域名条目存入哈希集合，查询时逐级检查主机名后缀，子域名（a.pastebin.com）随父域命中
+    - 不含点的条目存入标签集合，主机名任一标签与之相同即命中
+    """
+
+    def __init__(self, entries: Iterable[str] = ()):
+        self.domains = set()
+        self.labels = set()
+        for entry in entries:
+            domain = normalize_domain(entry)
+            if domain is None:
+                continue
+            if "." in domain:
+                self.domains.add(domain)
+            else:
+                self.labels.add(domain)
+
+    @property
+    def version(self) -> str:
+        raw = "\n".join(sorted(self.domains) + ["!" + label for label in sorted(self.labels)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    def has_domain(self, domain: str) -> bool:
+        return domain in self.domains
+
+    def has_label(self, label: str) -> bool:
+        return label in self.labels
+
+    @property
+    def label_count(self) -> int:
+        return len(self.labels)
+
+    def __len__(self) -> int:
+        return len(self.domains) + len(self.labels)
+
+
+class MappedDomainTable:
+    """
+    内存映射的域名哈希表
+    --------------------
+    - 文件由 build 生成：头部 + 开放寻址槽位表（crc32 / 偏移 / 长度）+ 键字节串
+    - 通过 mmap 只读打开，数万条域名无需逐条载入 Python 对象，查询按需读取对应槽位
+    - 与 DomainSet 接口一致；序列化时只保存文件路径，进程池 worker 重新映射
+    """
+
+    def __init__(self, path: str, version: str = ""):
+        self.path = path
+        self.version = version
+        self._open()
+
+    def _open(self) -> None:
+        with open(self.path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, slot_count, domain_count, label_count = _HEADER.unpack_from(self._map, 0)
+        if magic != _TABLE_MAGIC or slot_count & (slot_count - 1):
+            self._map.close()
+            raise ValueError(f"域名索引格式错误: {self.path}")
+        self._mask = slot_count - 1
+        self._domain_count = domain_count
+        self._label_count = label_count
+
+    @classmethod
+    def build(cls, path: str, domains: Iterable[str], labels: Iterable[str] = (), version: str = "") -> "MappedDomainTable":
+        keys = [domain.encode("ascii") for domain in sorted(set(domains))]
+        label_keys = [_LABEL_PREFIX + label.encode("ascii") for label in sorted(set(labels))]
+        entries = keys + label_keys
+        slot_count = 8
+        while slot_count < len(entries) * 2:
+            slot_count *= 2
+        mask = slot_count - 1
+        slots = [(0, 0, 0)] * slot_count
+        offset = _HEADER.size + _SLOT.size * slot_count
+        blob = bytearray()
+        for key in entries:
+            checksum = zlib.crc32(key)
+            index = checksum & mask
+            while slots[index][2]:
+                index = (index + 1) & mask
+            slots[index] = (checksum, offset + len(blob), len(key))
+            blob += key
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as handle:
+                handle.write(_HEADER.pack(_TABLE_MAGIC, slot_count, len(keys), len(label_keys)))
+                handle.write(b"".join(_SLOT.pack(*slot) for slot in slots))
+                handle.write(bytes(blob))
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        return cls(path, version)
+
+    def _lookup(self, key: bytes) -> bool:
+        checksum = zlib.crc32(key)
+        table = self._map
+        mask = self._mask
+        index = checksum & mask
+        while True:
+            slot_checksum, offset, length = _SLOT.unpack_from(table, _HEADER.size + _SLOT.size * index)
+            if not length:
+                return False
+            if slot_checksum == checksum and length == len(key) and table[offset : offset + length] == key:
+                return True
+            index = (index + 1) & mask
+
+    def has_domain(self, domain: str) -> bool:
+        return self._lookup(domain.encode("ascii"))
+
+    def has_label(self, label: str) -> bool:
+        return self._lookup(_LABEL_PREFIX + label.encode("ascii"))
+
+    @property
+    def label_count(self) -> int:
+        return self._label_count
+
+    def __len__(self) -> int:
+        return self._domain_count + self._label_count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __getstate__(self):
+        return {"path": self.path, "version": self.version}
+
+    def __setstate__(self, state) -> None:
+        self.path = state["path"]
+        self.version = state["version"]
+        self._open()
+
+
+def load_domain_feed(path: str, cache_dir: Optional[str] = None):
+    """
+    加载域名威胁情报文件（每行一个条目，支持 # 注释、hosts 与 AdBlock 格式）。
+    首次加载时解析并生成内存映射索引，写入源文件旁的 __rulecache__；文件内容不变时直接映射已有索引。
+    索引写入失败（只读目录等）时退回内存集合。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    version = digest.hexdigest()[:16]
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), ARTIFACT_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    table_path = os.path.join(cache_dir, f"{stem}.{version}.domidx")
+    if os.path.exists(table_path):
+        try:
+            return MappedDomainTable(table_path, version)
+        except Exception:
+            pass
+
+    with open(path, encoding="utf-8", errors="ignore") as handle:
+        entries = DomainSet(handle)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        return MappedDomainTable.build(table_path, entries.domains, entries.labels, version)
+    except Exception:
+        return entries
+
+
+class DomainIndex:
+    """
+    恶意域名索引
+    ------------
+    - 规则包内的 malicious_domains 与外部威胁情报文件共同组成索引
+    - 按解析出的主机名匹配：example.com 命中自身及全部子域名，不再误命中路径或相似域名
+      （https://example.com/pastebin.com、notpastebin.com 均不命中 pastebin.com）
+    - 单次查询为 O(标签数) 次哈希查找，与黑名单规模无关
+    """
+
+    def __init__(self, domains: Iterable[str] = (), feeds: Sequence = ()):
+        self.base = DomainSet(domains)
+        self.feeds = list(feeds)
+        self._stores = [self.base] + self.feeds
+        self._label_stores = [store for store in self._stores if store.label_count]
+
+    @property
+    def feed_version(self) -> str:
+        return ",".join(str(getattr(feed, "version", "")) for feed in self.feeds)
+
+    def match(self, host: str) -> Optional[str]:
+        """返回命中的黑名单条目（域名或标签），未命中返回 None。"""
+        suffixes, labels = host_keys(host)
+        for suffix in suffixes:
+            for store in self._stores:
+                if store.has_domain(suffix):
+                    return suffix
+        for label in labels:
+            for store in self._label_stores:
+                if store.has_label(label):
+                    return label
+        return None
+
+    def match_link(self, link: str) -> Optional[str]:
+        host = url_host(link)
+        return self.match(host) if host else None
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self._stores)
@@ -0,0 +1,274 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from .ptd_matchers import RegexHazard  # type: ignore
+except ImportError:
+    from ptd_matchers import RegexHazard
+
+_WORKER_DETECTOR = None
+
+
+def _init_worker(detector_cls, snapshot: bytes) -> None:
+    global _WORKER_DETECTOR
+    _WORKER_DETECTOR = detector_cls.from_snapshot(snapshot)
+
+
+def _worker_analyze(prompt: str, fast: bool, budgeted: bool = True) -> Tuple[Dict[str, Any], float]:
+    started = time.perf_counter()
+    result = _WORKER_DETECTOR.analyze(prompt, fast=fast, budgeted=budgeted)
+    return result, time.perf_counter() - started
+
+
+def _timed_analyze(detector, prompt: str, fast: bool, guard: bool = False) -> Tuple[Dict[str, Any], float]:
+    started = time.perf_counter()
+    result = detector.analyze(prompt, fast=fast, guard=guard)
+    return result, time.perf_counter() - started
+
+
+def _terminate_pool(pool: ProcessPoolExecutor) -> None:
+    """强制结束进程池的全部 worker（卡在正则回溯中的 worker 无法响应正常关闭）。"""
+    terminate = getattr(pool, "terminate_workers", None)
+    if terminate is not None:
+        terminate()
+        return
+    for process in list((getattr(pool, "_processes", None) or {}).values()):
+        try:
+            process.terminate()
+        except Exception:
+            pass
+    # 不取消排队中的任务：进程池随即判定为损坏，其余任务以 BrokenProcessPool 结束，由调用方重试
+    pool.shutdown(wait=False)
+
+
+class DetectorExecutor:
+    """
+    检测执行器
+    ----------
+    - inline：直接在事件循环中调用 analyze（默认路径，短消息开销最小）
+    - thread：超过阈值的提示词交给线程池，避免长文本分析阻塞其他 handler 与 WebUI
+    - process：超过阈值的提示词交给进程池，worker 启动时从检测器快照加载规则表，无需逐任务重建
+    进程池不可用时自动降级为线程池，并记录排队深度与卸载延迟。
+
+    回溯防护（deadline > 0）：线程 / 内联路径以 guard=True 调用 analyze，被判定为可能引发正则大量回溯的输入
+    改交给可终止的进程 worker（process 后端复用主进程池，否则按 workers 另建一个进程池），超过 deadline 秒
+    即结束该 worker 并返回 detector.deadline_result()。process 后端的全部卸载任务同样受 deadline 约束。
+    受 deadline 约束的 worker 以 budgeted=False 执行全部规则，时限是唯一的约束。
+    进程池不可用时，回溯风险输入退回独立的线程池分析（受 regex_budget 约束），等待同样不超过 deadline 秒，
+    事件循环不会被卡住。
+    """
+
+    BACKENDS = ("inline", "thread", "process")
+
+    def __init__(
+        self, detector, backend: str = "thread", threshold: int = 4000, workers: int = 2, deadline: float = 0.0
+    ):
+        self.detector = detector
+        self.backend = backend if backend in self.BACKENDS else "inline"
+        self.threshold = max(0, int(threshold))
+        self.workers = max(1, int(workers))
+        self.deadline = max(0.0, float(deadline))
+        self._pool: Optional[Executor] = None
+        self._guard_pool: Optional[ProcessPoolExecutor] = None
+        self._hazard_pool: Optional[ThreadPoolExecutor] = None
+        self.guarded_count = 0
+        self.timeout_count = 0
+        self.last_hazard = ""
+        self.pending = 0
+        self.max_pending = 0
+        self.inline_count = 0
+        self.offloaded_count = 0
+        self.fallback_count = 0
+        self.total_latency = 0.0
+        self.total_compute = 0.0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+        self.last_error: Optional[str] = None
+
+    def _new_process_pool(self, workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(type(self.detector), self.detector.snapshot()),
+        )
+
+    def _ensure_pool(self) -> Executor:
+        if self._pool is None:
+            if self.backend == "process":
+                self._pool = self._new_process_pool(self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ptd-analyze")
+        return self._pool
+
+    def _ensure_guard_pool(self) -> ProcessPoolExecutor:
+        if self.backend == "process":
+            return self._ensure_pool()  # type: ignore[return-value]
+        if self._guard_pool is None:
+            self._guard_pool = self._new_process_pool(self.workers)
+        return self._guard_pool
+
+    def _ensure_hazard_pool(self) -> ThreadPoolExecutor:
+        if self._hazard_pool is None:
+            self._hazard_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ptd-hazard")
+        return self._hazard_pool
+
+    def _discard_process_pool(self, pool: ProcessPoolExecutor) -> None:
+        _terminate_pool(pool)
+        if pool is self._pool:
+            self._pool = None
+        if pool is self._guard_pool:
+            self._guard_pool = None
+
+    @property
+    def guarded(self) -> bool:
+        return self.deadline > 0
+
+    async def _run_in_process(self, prompt: str, fast: bool, rule: str = "") -> Tuple[Dict[str, Any], float]:
+        """在可终止的进程 worker 中分析；超过 deadline 时结束 worker 并返回超时判定。"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self._ensure_guard_pool()
+            # 有硬性时限的 worker 不再受正则预算约束，避免前面的慢规则耗尽预算、让其余规则被跳过
+            future = loop.run_in_executor(pool, _worker_analyze, prompt, fast, not self.deadline)
+            timed_out = await self._wait(future, prompt, rule)
+            if timed_out is not None:
+                self._discard_process_pool(pool)
+                return timed_out
+            # 同一进程池中的其他任务超时后 worker 被结束：换用新进程池重试一次
+            broken = future.cancelled() or isinstance(future.exception(), BrokenProcessPool)
+            if not broken or attempt or pool is self._pool or pool is self._guard_pool:
+                return future.result()
+        raise RuntimeError("unreachable")
+
+    async def _wait(
+        self, future: "asyncio.Future[Any]", prompt: str, rule: str
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        等待 future 至多 deadline 秒，超时返回 deadline_result，否则返回 None 由调用方读取 future。
+        asyncio.wait 不会因 future 自身被取消而抛出 CancelledError，抛出即说明调用方被取消。
+        """
+        try:
+            done, _ = await asyncio.wait({future}, timeout=self.deadline or None)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        if done:
+            return None
+        future.cancel()
+        self.timeout_count += 1
+        return self.detector.deadline_result(len(prompt), rule), self.deadline
+
+    def update_detector(self, detector) -> None:
+        """
+        切换检测器实例。线程池任务提交时已绑定检测器，已提交的分析继续在旧实例上完成；
+        进程池 worker 持有旧快照，旧池在处理完已提交的任务后退出，新任务由按新快照启动的进程池执行。
+        """
+        self.detector = detector
+        if self.backend == "process" and self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._guard_pool is not None:
+            self._guard_pool.shutdown(wait=False)
+            self._guard_pool = None
+
+    def should_offload(self, prompt: str) -> bool:
+        return self.backend != "inline" and len(prompt) >= self.threshold
+
+    async def analyze(self, prompt: str, fast: bool = False) -> Dict[str, Any]:
+        if not self.should_offload(prompt):
+            self.inline_count += 1
+            try:
+                return self.detector.analyze(prompt, fast=fast, guard=self.guarded)
+            except RegexHazard as hazard:
+                return await self._analyze_hazard(prompt, fast, hazard)
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        started = time.perf_counter()
+        try:
+            try:
+                if self.backend == "process":
+                    result, compute = await self._run_in_process(prompt, fast)
+                else:
+                    result, compute = await loop.run_in_executor(
+                        self._ensure_pool(), _timed_analyze, self.detector, prompt, fast, self.guarded
+                    )
+            except RegexHazard as hazard:
+                result = await self._analyze_hazard(prompt, fast, hazard)
+                compute = time.perf_counter() - started
+            except Exception as exc:
+                if self.backend != "process":
+                    raise
+                # 进程池损坏或快照无法序列化时降级为线程池，保证检测不中断
+                self.fallback_count += 1
+                self.shutdown(wait=False)
+                self.backend = "thread"
+                self.last_error = str(exc)
+                result, compute = await loop.run_in_executor(
+                    self._ensure_pool(), _timed_analyze, self.detector, prompt, fast
+                )
+        finally:
+            self.pending -= 1
+        latency = time.perf_counter() - started
+        self.offloaded_count += 1
+        self.total_latency += latency
+        self.total_compute += compute
+        self.max_latency = max(self.max_latency, latency)
+        self.last_latency = latency
+        return result
+
+    async def _analyze_hazard(self, prompt: str, fast: bool, hazard: RegexHazard) -> Dict[str, Any]:
+        """回溯风险输入：改在可终止的进程 worker 中带时限地分析；进程池不可用时退回线程池，同样带时限等待。"""
+        self.guarded_count += 1
+        self.last_hazard = hazard.rule
+        try:
+            result, _ = await self._run_in_process(prompt, fast, hazard.rule)
+        except Exception as exc:
+            self.last_error = str(exc)
+            future = asyncio.get_running_loop().run_in_executor(
+                self._ensure_hazard_pool(), _timed_analyze, self.detector, prompt, fast
+            )
+            # 线程无法强制结束：超时后不再等待，分析在后台跑完即释放线程
+            timed_out = await self._wait(future, prompt, hazard.rule)
+            result, _ = timed_out if timed_out is not None else future.result()
+        result["regex_hazard"] = {"rule": hazard.rule, "estimate": hazard.estimate}
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        offloaded = self.offloaded_count
+        avg_latency = self.total_latency / offloaded if offloaded else 0.0
+        avg_compute = self.total_compute / offloaded if offloaded else 0.0
+        return {
+            "backend": self.backend,
+            "threshold": self.threshold,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "inline": self.inline_count,
+            "offloaded": offloaded,
+            "fallbacks": self.fallback_count,
+            "avg_latency_ms": avg_latency * 1000,
+            "avg_queue_wait_ms": max(0.0, avg_latency - avg_compute) * 1000,
+            "max_latency_ms": self.max_latency * 1000,
+            "last_latency_ms": self.last_latency * 1000,
+            "last_error": self.last_error or "",
+            "deadline": self.deadline,
+            "guarded": self.guarded_count,
+            "timeouts": self.timeout_count,
+            "last_hazard": self.last_hazard,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+        if self._guard_pool is not None:
+            self._guard_pool.shutdown(wait=wait, cancel_futures=True)
+            self._guard_pool = None
+        if self._hazard_pool is not None:
+            self._hazard_pool.shutdown(wait=wait, cancel_futures=True)
+            self._hazard_pool = None
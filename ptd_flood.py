@@ -0,0 +1,273 @@
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    from .ptd_normalize import normalize_text  # type: ignore
+except ImportError:
+    from ptd_normalize import normalize_text
+
+# MinHash 签名长度与 LSH 分段：64 个桶切成 16 段 × 4 行，
+# 相似度 0.7 的两条消息至少一段完全相同的概率约 99%，互不相关的消息几乎不会成为候选
+SIGNATURE_BINS = 64
+BAND_ROWS = 4
+SHINGLE_SIZE = 3
+# 参与指纹的最大字符数：洪泛消息通常很短，超长文本只取开头部分
+MAX_FINGERPRINT_CHARS = 4096
+
+_MASK = (1 << 64) - 1
+_EMPTY = 1 << 64
+_GOLDEN = 0x9E3779B97F4A7C15
+# 标点、空白、表情等不参与指纹：插入符号 / 换行 / 表情的变体与原文指纹相同
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def minhash_signature(text: str, min_length: int = 16) -> Optional[Tuple[int, ...]]:
+    """
+    计算消息的 MinHash 签名（单次哈希 + 分桶取最小值）
+    - 文本先经统一规范化并剔除非文字字符，再取字符 3-gram 集合
+    - 每个 3-gram 只做一次 CRC32（跨进程、跨重启结果一致），按低 6 位分入 64 个桶，每桶保留最小值
+    - 空桶按环形方向借用最近的非空桶并叠加偏移（densification），短消息同样得到完整签名
+    剔除后不足 min_length 个字符的消息返回 None（过短的消息交给精确判定缓存）。
+    """
+    stripped = _NON_WORD.sub("", normalize_text(text or "")[1])[:MAX_FINGERPRINT_CHARS]
+    if len(stripped) < max(min_length, SHINGLE_SIZE):
+        return None
+    signature = [_EMPTY] * SIGNATURE_BINS
+    shingles = {stripped[index:index + SHINGLE_SIZE] for index in range(len(stripped) - SHINGLE_SIZE + 1)}
+    for shingle in shingles:
+        value = zlib.crc32(shingle.encode("utf-8", "surrogatepass"))
+        slot = value & (SIGNATURE_BINS - 1)
+        if value < signature[slot]:
+            signature[slot] = value
+    if _EMPTY in signature:
+        filled = next(index for index, value in enumerate(signature) if value != _EMPTY)
+        source, source_value = filled + SIGNATURE_BINS, signature[filled]
+        densified = list(signature)
+        for index in range(SIGNATURE_BINS - 1, -1, -1):
+            if signature[index] != _EMPTY:
+                source, source_value = index, signature[index]
+                continue
+            densified[index] = (source_value + (source - index) * _GOLDEN) & _MASK
+        signature = densified
+    return tuple(signature)
+
+
+def signature_similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """两个签名中取值相同的桶占比，即 3-gram 集合 Jaccard 相似度的估计。"""
+    return sum(1 for a, b in zip(left, right) if a == b) / SIGNATURE_BINS
+
+
+def _band_keys(signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+    return [
+        (band, hash(signature[start:start + BAND_ROWS]))
+        for band, start in enumerate(range(0, SIGNATURE_BINS, BAND_ROWS))
+    ]
+
+
+class FloodCluster:
+    """一组近似重复的已拦截消息：首条消息的签名与判定，以及后续命中的统计。"""
+
+    __slots__ = (
+        "id",
+        "signature",
+        "variant",
+        "analysis",
+        "preview",
+        "expires",
+        "first_seen",
+        "last_seen",
+        "hits",
+        "senders",
+        "band_keys",
+    )
+
+    def __init__(self, cluster_id: int, signature: Tuple[int, ...], variant: str, analysis: Dict[str, Any], preview: str):
+        now = time.time()
+        self.id = cluster_id
+        self.signature = signature
+        self.variant = variant
+        self.analysis = analysis
+        self.preview = preview
+        self.expires = 0.0
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 0
+        self.senders: Set[str] = set()
+        self.band_keys = _band_keys(signature)
+
+
+class NearDuplicateIndex:
+    """
+    近似重复洪泛索引（MinHash + LSH）
+    ------------------------------
+    - 只收录被判定为风险的消息；同一攻击文本稍作改动后由多个账号刷屏时，
+      与近期已拦截消息相似度达到阈值的新消息直接继承其判定，跳过完整分析与 LLM 复核
+    - 签名按 16 段建立 LSH 倒排，查询只比对至少一段相同的候选簇，开销与索引规模基本无关
+    - 容量超限时淘汰最久未命中的簇，超过 TTL 未再命中的簇在查询 / 写入时清理；命中会刷新 TTL
+    - variant 区分不同防护模式下产生的判定，规则集版本变化时整体失效
+    """
+
+    def __init__(self, capacity: int = 512, ttl: float = 300.0, similarity: float = 0.7, min_length: int = 16):
+        self.capacity = max(1, int(capacity))
+        self.ttl = max(1.0, float(ttl))
+        self.similarity = min(1.0, max(0.1, float(similarity)))
+        self.min_length = max(SHINGLE_SIZE, int(min_length))
+        self._clusters: "OrderedDict[int, FloodCluster]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+        self._next_id = 1
+        self._version: Optional[str] = None
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def _sync_version(self, version: str) -> None:
+        if version != self._version:
+            if self._clusters:
+                self.invalidations += 1
+            self.clear()
+            self._version = version
+
+    def _remove(self, cluster: FloodCluster) -> None:
+        self._clusters.pop(cluster.id, None)
+        for key in cluster.band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(cluster.id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _expire(self, now: float) -> None:
+        while self._clusters:
+            cluster = next(iter(self._clusters.values()))
+            if cluster.expires > now:
+                break
+            self._remove(cluster)
+            self.expirations += 1
+
+    def signature(self, prompt: str) -> Optional[Tuple[int, ...]]:
+        return minhash_signature(prompt, self.min_length)
+
+    def match(
+        self, prompt: str, version: str, variant: str = "", sender: str = ""
+    ) -> Optional[Tuple[FloodCluster, float]]:
+        """
+        查找与 prompt 近似重复的簇。索引为空时不计算签名，正常流量下没有额外开销。
+        命中时刷新簇的 TTL 并累计命中次数 / 发送者，返回 (簇, 相似度)。
+        """
+        self._sync_version(version)
+        self._expire(time.monotonic())
+        if not self._clusters:
+            return None
+        signature = self.signature(prompt)
+        if signature is None:
+            return None
+        self.lookups += 1
+        candidates: Set[int] = set()
+        for key in _band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket:
+                candidates.update(bucket)
+        best: Optional[Tuple[FloodCluster, float]] = None
+        for cluster_id in candidates:
+            cluster = self._clusters[cluster_id]
+            if cluster.variant != variant:
+                continue
+            score = signature_similarity(signature, cluster.signature)
+            if score >= self.similarity and (best is None or score > best[1]):
+                best = (cluster, score)
+        if best is None:
+            return None
+        cluster = best[0]
+        cluster.hits += 1
+        cluster.last_seen = time.time()
+        cluster.expires = time.monotonic() + self.ttl
+        if sender and len(cluster.senders) < 256:
+            cluster.senders.add(sender)
+        self._clusters.move_to_end(cluster.id)
+        self.hits += 1
+        return best
+
+    def add(
+        self, prompt: str, version: str, analysis: Dict[str, Any], variant: str = "", sender: str = "", preview: str = ""
+    ) -> Optional[FloodCluster]:
+        """收录一条被判定为风险的消息；过短而无法生成签名的消息返回 None。"""
+        self._sync_version(version)
+        now = time.monotonic()
+        self._expire(now)
+        signature = self.signature(prompt)
+        if signature is None:
+            return None
+        stored = dict(analysis)
+        stored.pop("prompt", None)
+        if isinstance(stored.get("signals"), list):
+            stored["signals"] = list(stored["signals"])
+        cluster = FloodCluster(self._next_id, signature, variant, stored, preview)
+        self._next_id += 1
+        cluster.expires = now + self.ttl
+        if sender:
+            cluster.senders.add(sender)
+        self._clusters[cluster.id] = cluster
+        for key in cluster.band_keys:
+            self._buckets.setdefault(key, set()).add(cluster.id)
+        while len(self._clusters) > self.capacity:
+            self._remove(next(iter(self._clusters.values())))
+            self.evictions += 1
+        return cluster
+
+    def inherit(self, cluster: FloodCluster, similarity: float) -> Dict[str, Any]:
+        """生成继承自簇的判定副本，附带簇编号、相似度与累计命中次数。"""
+        analysis = dict(cluster.analysis)
+        if isinstance(analysis.get("signals"), list):
+            analysis["signals"] = list(analysis["signals"])
+        analysis["near_duplicate"] = {
+            "cluster": cluster.id,
+            "similarity": round(similarity, 3),
+            "hits": cluster.hits,
+            "origin_trigger": cluster.analysis.get("trigger", ""),
+        }
+        return analysis
+
+    def clusters(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """按命中次数、最近命中时间排序的活跃簇摘要，供 WebUI 展示。"""
+        self._expire(time.monotonic())
+        ranked = sorted(self._clusters.values(), key=lambda cluster: (cluster.hits, cluster.last_seen), reverse=True)
+        return [
+            {
+                "id": cluster.id,
+                "preview": cluster.preview,
+                "hits": cluster.hits,
+                "senders": len(cluster.senders),
+                "first_seen": cluster.first_seen,
+                "last_seen": cluster.last_seen,
+                "severity": cluster.analysis.get("severity", ""),
+                "trigger": cluster.analysis.get("trigger", ""),
+                "variant": cluster.variant,
+            }
+            for cluster in ranked[:limit]
+        ]
+
+    def clear(self) -> None:
+        self._clusters.clear()
+        self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._clusters),
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "similarity": self.similarity,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": (self.hits / self.lookups) if self.lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
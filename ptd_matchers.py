@@ -0,0 +1,596 @@
+import re
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _compiler as sre_compile
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile  # type: ignore
+    import sre_constants  # type: ignore
+    import sre_parse  # type: ignore
+
+_REPEAT_OPS = tuple(
+    getattr(sre_constants, name)
+    for name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+    if hasattr(sre_constants, name)
+)
+
+
+class LazyPattern:
+    """
+    延迟编译的正则
+    --------------
+    - 只保存源码与标志位，首次 search 时才调用 re.compile
+    - 序列化时同样只写入源码与标志位，规则包工件与进程池快照无需携带编译结果
+    - 其余属性访问转发给编译后的 re.Pattern
+    """
+
+    __slots__ = ("pattern", "flags", "_compiled")
+
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled: Optional["re.Pattern[str]"] = None
+
+    def compiled(self) -> "re.Pattern[str]":
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._compiled is not None
+
+    def search(self, string: str, *args):
+        return self.compiled().search(string, *args)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.compiled(), name)
+
+    def __getstate__(self):
+        return (self.pattern, self.flags)
+
+    def __setstate__(self, state) -> None:
+        self.pattern, self.flags = state
+        self._compiled = None
+
+    def __repr__(self) -> str:
+        return f"LazyPattern({self.pattern!r}, {self.flags})"
+
+
+class LiteralMatcher:
+    """
+    多模式字面量匹配器（Aho-Corasick 自动机）
+    ----------------------------------------
+    - 构建阶段登记所有词条，并为每个词条附带分类 / 顺序 / 权重标签
+    - 匹配阶段对文本做一次线性扫描，返回按分类归组的全部命中
+    - 同一字面量可被多个分类共享（例如既是特征词又是仇恨指示词）
+    """
+
+    def __init__(self):
+        self._literal_ids: Dict[str, int] = {}
+        self._tags: List[List[Tuple[str, int, str, int]]] = []
+        self._delta: List[Dict[str, int]] = []
+        self._outputs: List[Tuple[int, ...]] = []
+        self._built = False
+
+    def add(self, literal: str, category: str, order: int, term: str, weight: int = 0) -> None:
+        if not literal:
+            return
+        literal_id = self._literal_ids.get(literal)
+        if literal_id is None:
+            literal_id = len(self._tags)
+            self._literal_ids[literal] = literal_id
+            self._tags.append([])
+        self._tags[literal_id].append((category, order, term, weight))
+        self._built = False
+
+    def build(self) -> "LiteralMatcher":
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for literal, literal_id in self._literal_ids.items():
+            state = 0
+            for ch in literal:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(literal_id)
+
+        # 广度优先计算失败指针，并把转移表展开为确定自动机。
+        # 仅保存与根节点转移不同的条目，未命中时回落到根节点，控制内存占用。
+        root = goto[0]
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict() for _ in goto]
+        delta[0] = dict(root)
+        queue = deque(root.values())
+        while queue:
+            state = queue.popleft()
+            fallback = delta[fail[state]] if fail[state] else {}
+            resolved = dict(fallback)
+            for ch, child in goto[state].items():
+                target = fallback.get(ch)
+                if target is None:
+                    target = root.get(ch, 0)
+                fail[child] = target
+                outputs[child].extend(outputs[target])
+                resolved[ch] = child
+                queue.append(child)
+            delta[state] = resolved
+
+        self._delta = delta
+        self._outputs = [tuple(ids) for ids in outputs]
+        self._built = True
+        return self
+
+    def feed(self, text: str, state: int, hits: Set[int]) -> int:
+        """
+        从自动机状态 state 继续扫描 text，命中的字面量编号写入 hits，返回扫描结束时的状态。
+        分段调用时跨段边界的词条同样能被识别，适用于流式输入。
+        """
+        if not self._built:
+            self.build()
+        delta = self._delta
+        root = delta[0]
+        outputs = self._outputs
+        for ch in text:
+            nxt = delta[state].get(ch) if state else None
+            state = root.get(ch, 0) if nxt is None else nxt
+            if outputs[state]:
+                hits.update(outputs[state])
+        return state
+
+    def scan_ids(self, text: str) -> Set[int]:
+        hits: Set[int] = set()
+        self.feed(text, 0, hits)
+        return hits
+
+    def scan(self, text: str) -> Dict[str, List[Tuple[int, str, int]]]:
+        """
+        返回 ``{category: [(order, term, weight), ...]}``，组内按登记顺序排列。
+        """
+        return self.group(self.scan_ids(text))
+
+    def group(self, hit_ids: Set[int]) -> Dict[str, List[Tuple[int, str, int]]]:
+        if not hit_ids:
+            return {}
+        grouped: Dict[str, List[Tuple[int, str, int]]] = {}
+        for literal_id in hit_ids:
+            for category, order, term, weight in self._tags[literal_id]:
+                grouped.setdefault(category, []).append((order, term, weight))
+        for entries in grouped.values():
+            entries.sort()
+        return grouped
+
+    @property
+    def state_count(self) -> int:
+        return len(self._delta)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+
+# re 在 IGNORECASE 下会把这些字符视为 ASCII 字母，而 str.lower() 不会折叠它们。
+_ANCHOR_FOLD = str.maketrans({"İ": "i", "ı": "i", "ſ": "s"})
+
+
+def anchor_text(text: str, normalized: str) -> str:
+    """
+    生成锚点检测所用文本：纯 ASCII 文本直接复用 normalized，
+    否则先折叠 re 大小写等价字符再小写，保证锚点检测不会漏掉正则能匹配的内容。
+    """
+    if text.isascii():
+        return normalized
+    return text.translate(_ANCHOR_FOLD).lower()
+
+
+def _best_group(groups: List[Set[str]]) -> Optional[Set[str]]:
+    if not groups:
+        return None
+    return max(groups, key=lambda group: (min(len(item) for item in group), -len(group)))
+
+
+def _required_groups(items) -> List[Set[str]]:
+    """
+    从正则语法树中提取“必需字面量组”：任何一次匹配都至少包含每组中的一个字面量。
+    无法确定的结构（字符集、可选重复、断言等）直接跳过，只会让过滤更宽松。
+    """
+    groups: List[Set[str]] = []
+    run: List[str] = []
+
+    def flush():
+        if run:
+            groups.append({"".join(run)})
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            groups.extend(_required_groups(av[-1]))
+        elif op is sre_constants.ATOMIC_GROUP:
+            groups.extend(_required_groups(av))
+        elif op is sre_constants.BRANCH:
+            alternatives: Set[str] = set()
+            for branch in av[1]:
+                best = _best_group(_required_groups(branch))
+                if best is None:
+                    alternatives = set()
+                    break
+                alternatives |= best
+            if alternatives:
+                groups.append(alternatives)
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            groups.extend(_required_groups(av[2]))
+    flush()
+    return groups
+
+
+class SignatureSet:
+    """
+    正则特征集合
+    ------------
+    - 编译时从每条正则中提取必需字面量锚点（如 ``[``、``<``、``/system``、三反引号、中文动词）
+    - 每条特征最具区分度的锚点组汇成一条“门控”正则，良性消息一次 C 层扫描即可整体放行
+    - 门控命中后逐条核对锚点，仅对锚点齐全的候选正则执行 search，输出顺序与原特征库一致
+    """
+
+    def __init__(self, signatures: List[Dict[str, Any]]):
+        self.signatures = list(signatures)
+        self._requirements: List[Tuple[Tuple[str, ...], ...]] = []
+        self._always: List[int] = []
+        gate_literals: Set[str] = set()
+        for index, signature in enumerate(self.signatures):
+            pattern = signature["pattern"]
+            try:
+                groups = _required_groups(sre_parse.parse(pattern.pattern, pattern.flags))
+            except Exception:
+                groups = []
+            required: List[Tuple[str, ...]] = []
+            for group in groups:
+                folded = tuple(sorted({literal.translate(_ANCHOR_FOLD).lower() for literal in group}))
+                if folded not in required:
+                    required.append(folded)
+            # 区分度高（最短字面量更长、备选更少）的锚点组排在前面，便于尽早短路
+            required.sort(key=lambda group: (-min(len(item) for item in group), len(group)))
+            self._requirements.append(tuple(required))
+            if required:
+                gate_literals.update(required[0])
+            else:
+                self._always.append(index)
+        self._gate = None
+        if gate_literals and not self._always:
+            ordered = sorted(gate_literals, key=lambda item: (-len(item), item))
+            self._gate = re.compile("|".join(re.escape(item) for item in ordered))
+
+    def state(self) -> Tuple[Any, ...]:
+        """导出编译结果（不含特征本身），供规则包工件缓存。"""
+        return (self._requirements, self._always, self._gate.pattern if self._gate is not None else None)
+
+    @classmethod
+    def restore(cls, signatures: List[Dict[str, Any]], state: Tuple[Any, ...]) -> "SignatureSet":
+        """用 state() 导出的结果重建特征集合，跳过正则语法树分析。"""
+        requirements, always, gate = state
+        if len(requirements) != len(signatures):
+            raise ValueError("特征数量与编译结果不一致")
+        instance = cls.__new__(cls)
+        instance.signatures = list(signatures)
+        instance._requirements = list(requirements)
+        instance._always = list(always)
+        instance._gate = re.compile(gate) if gate is not None else None
+        return instance
+
+    @property
+    def anchored_count(self) -> int:
+        return len(self.signatures) - len(self._always)
+
+    def required_literals(self) -> Optional[Set[str]]:
+        """
+        每条特征首个锚点组的并集：任何一条特征命中时，文本（小写锚点文本）必然包含其中之一。
+        存在无法提取锚点的特征时返回 None。
+        """
+        if self._always:
+            return None
+        return {literal for required in self._requirements for literal in required[0]}
+
+    def candidates(self, folded_text: str) -> List[int]:
+        """返回锚点全部出现的特征下标（升序）。"""
+        if self._gate is not None and self._gate.search(folded_text) is None:
+            return []
+        result = []
+        for index, required in enumerate(self._requirements):
+            for group in required:
+                for literal in group:
+                    if literal in folded_text:
+                        break
+                else:
+                    break
+            else:
+                result.append(index)
+        return result
+
+    def search(
+        self, text: str, folded_text: str, budget: Optional["RegexBudget"] = None
+    ) -> List[Tuple[Dict[str, Any], Any]]:
+        matches = []
+        signatures = self.signatures
+        for index in self.candidates(folded_text):
+            signature = signatures[index]
+            if budget is None:
+                match = signature["pattern"].search(text)
+            else:
+                match = budget.search(signature["name"], signature["pattern"], text)
+            if match:
+                matches.append((signature, match))
+        return matches
+
+
+# 英文字母按常见程度排列（空格最常见），用于挑选最罕见的二元组作为代表片段
+_COMMON_CHARS = "zqjxkvbywgpfmucdlhrsnioate "
+
+
+def _bigram_commonness(bigram: str) -> int:
+    return sum(_COMMON_CHARS.find(ch) + 1 for ch in bigram)
+
+
+class NGramPrefilter:
+    """
+    字符 n-gram 预筛
+    ----------------
+    - 为每个必需字面量选一个代表片段：单字符字面量取其本身，其余取其中最罕见的二元组；
+      已被现有片段覆盖的字面量不再新增片段
+    - 文本包含某字面量 ⇒ 必然包含该字面量的全部二元组 ⇒ 必然包含其代表片段，
+      因此 may_match 返回 False 时文本不可能包含任何字面量（无漏报），covers 可逐条复核这一点
+    - 代表片段按首字符归组编译为一条正则（``a[bc]|d[e]|%``），一次 C 层扫描完成检查
+    """
+
+    def __init__(self, literals: Iterable[str] = ()):
+        self.chars: Set[str] = set()
+        self.bigrams: Set[str] = set()
+        self._pattern: Optional["re.Pattern[str]"] = None
+        for literal in sorted(set(literals), key=lambda item: (len(item), item)):
+            self.add(literal)
+
+    def add(self, literal: str) -> None:
+        if not literal:
+            raise ValueError("空字面量会命中任意文本，无法预筛")
+        if self.covers(literal):
+            return
+        self._pattern = None
+        if len(literal) == 1:
+            self.chars.add(literal)
+            return
+        bigrams = (literal[index : index + 2] for index in range(len(literal) - 1))
+        self.bigrams.add(min(bigrams, key=_bigram_commonness))
+
+    def _compile(self) -> "re.Pattern[str]":
+        followers: Dict[str, Set[str]] = {}
+        for bigram in self.bigrams:
+            if bigram[0] not in self.chars:
+                followers.setdefault(bigram[0], set()).add(bigram[1])
+        branches = [re.escape(char) for char in sorted(self.chars)]
+        for first, seconds in sorted(followers.items()):
+            branches.append(re.escape(first) + "[" + "".join(re.escape(char) for char in sorted(seconds)) + "]")
+        # 没有任何片段时返回永不命中的正则
+        return re.compile("|".join(branches) or "(?!)")
+
+    def covers(self, literal: str) -> bool:
+        """literal 中是否包含某个代表片段（即包含 literal 的文本必然通过预筛）。"""
+        if not self.chars.isdisjoint(literal):
+            return True
+        return any(bigram in literal for bigram in self.bigrams)
+
+    def may_match(self, text: str) -> bool:
+        if self._pattern is None:
+            self._pattern = self._compile()
+        return self._pattern.search(text) is not None
+
+    def __len__(self) -> int:
+        return len(self.chars) + len(self.bigrams)
+
+
+def _is_wide_repeat(op, av) -> bool:
+    """重复体可匹配任意字符（``.``、``[^...]``、非某字面量）且可重复多次：这样的间隔能跨越其他字面量。"""
+    if op not in _REPEAT_OPS or av[1] <= 1 or len(av[2]) != 1:
+        return False
+    body_op, body_av = av[2][0]
+    if body_op in (sre_constants.ANY, sre_constants.NOT_LITERAL):
+        return True
+    return body_op is sre_constants.IN and bool(body_av) and body_av[0][0] is sre_constants.NEGATE
+
+
+def _has_wide_repeat(items) -> bool:
+    for op, av in items:
+        if _is_wide_repeat(op, av):
+            return True
+        if op is sre_constants.SUBPATTERN and _has_wide_repeat(av[-1]):
+            return True
+    return False
+
+
+def _gap_segments(items, segments: List[list]) -> List[list]:
+    """以宽间隔为界把正则语法树切成若干段（宽间隔位于分组内时展开该分组）。"""
+    for op, av in items:
+        if _is_wide_repeat(op, av):
+            segments.append([])
+        elif op is sre_constants.SUBPATTERN and _has_wide_repeat(av[-1]):
+            _gap_segments(av[-1], segments)
+        else:
+            segments[-1].append((op, av))
+    return segments
+
+
+class RegexHazard(Exception):
+    """输入对某条正则存在回溯风险；调用方应改在可终止的 worker 中、带时限地分析。"""
+
+    def __init__(self, rule: str, estimate: int):
+        super().__init__(f"{rule}（估计回溯路径 {estimate}）")
+        self.rule = rule
+        self.estimate = estimate
+
+
+class BacktrackProfile:
+    """
+    正则回溯风险画像
+    ----------------
+    - 以宽间隔（``.{0,N}``、``.*?``、``[^x]+`` 等）把正则切成若干段，每段取一组必需字面量
+    - 回溯路径数的上界近似为各段字面量出现次数的前缀乘积之和：首段每次出现都是一个起点，
+      其后每段的每次出现都可能与前面的组合配对；日常消息中该值通常只有个位数
+    - 只有两段及以上的正则需要画像，单段正则的匹配开销与文本长度呈线性
+    - 字面量计数只是粗略上界（例如 ``\\[\\d{2}:...\\]`` 一段只剩一个 ``[``）：粗估达到上限时，
+      改用各段自身的结构（段内不含宽间隔，匹配开销线性）重新计数，
+      QQ 的 [图片] / [表情] 占位符、粘贴的聊天记录不会再因裸字面量而被误判
+    - 与 LazyPattern 相同，只保存源码与标志位，各段的正则首次复核时才编译，序列化时不携带
+    """
+
+    __slots__ = ("name", "groups", "source", "flags", "_segments")
+
+    def __init__(self, name: str, groups: Tuple[Tuple[str, ...], ...], source: str = "", flags: int = 0):
+        self.name = name
+        self.groups = groups
+        self.source = source
+        self.flags = flags
+        self._segments: Optional[List[Any]] = None
+
+    @staticmethod
+    def _segment_groups(tree: Any) -> List[Tuple[list, Tuple[str, ...]]]:
+        pairs = []
+        for segment in _gap_segments(tree, [[]]):
+            best = _best_group(_required_groups(segment))
+            if best:
+                pairs.append((segment, tuple(sorted({literal.translate(_ANCHOR_FOLD).lower() for literal in best}))))
+        return pairs
+
+    @classmethod
+    def build(cls, name: str, pattern: Any) -> Optional["BacktrackProfile"]:
+        try:
+            tree = sre_parse.parse(pattern.pattern, pattern.flags)
+        except Exception:
+            return None
+        groups = tuple(group for _, group in cls._segment_groups(tree))
+        return cls(name, groups, pattern.pattern, pattern.flags) if len(groups) >= 2 else None
+
+    def _compile_segments(self) -> List[Any]:
+        """按段编译正则；无法单独编译的段（例如引用了其他段的分组）记为 None，退回字面量计数。"""
+        segments: List[Any] = []
+        try:
+            tree = sre_parse.parse(self.source, self.flags)
+            pairs = self._segment_groups(tree)
+        except Exception:
+            pairs = []
+        for segment, _ in pairs:
+            try:
+                segments.append(sre_compile.compile(sre_parse.SubPattern(tree.state, list(segment)), self.flags))
+            except Exception:
+                segments.append(None)
+        if len(segments) != len(self.groups):
+            segments = [None] * len(self.groups)
+        return segments
+
+    def estimate(self, text: str, limit: int) -> int:
+        """估计回溯路径数，达到 limit 即停止计数；字面量粗估达到 limit 时按各段结构复核。"""
+        candidates = [sum(text.count(literal) for literal in group) for group in self.groups]
+        total = self._accumulate(candidates, candidates, limit)
+        if total < limit or not self.source:
+            return total
+        if self._segments is None:
+            self._segments = self._compile_segments()
+        matches = []
+        for count, segment in zip(candidates, self._segments):
+            if segment is not None and count:
+                count = 0
+                for _ in segment.finditer(text):
+                    count += 1
+                    if count >= limit:
+                        break
+            matches.append(count)
+            if not count:
+                break
+        return self._accumulate(candidates, matches, limit)
+
+    @staticmethod
+    def _accumulate(candidates: List[int], matches: List[int], limit: int) -> int:
+        """
+        第 k 段的尝试次数 = 前 k-1 段完整匹配数之积 × 第 k 段锚点出现次数：
+        锚点只决定在哪里尝试，只有整段匹配成功才会把回溯链延伸到下一段。
+        """
+        total = 0
+        product = 1
+        for candidate, matched in zip(candidates, matches):
+            if not candidate:
+                break
+            total += product * candidate
+            if total >= limit or not matched:
+                break
+            product *= matched
+        return total
+
+    def __getstate__(self):
+        return (self.name, self.groups, self.source, self.flags)
+
+    def __setstate__(self, state) -> None:
+        self.name, self.groups, self.source, self.flags = state
+        self._segments = None
+
+    def __repr__(self) -> str:
+        return f"BacktrackProfile({self.name!r}, {len(self.groups)} 段)"
+
+
+class RegexBudget:
+    """
+    单条消息（分窗分析时为单个窗口）的正则时间预算
+    ----------------------------------------------
+    - 逐条记录 search 耗时，单条规则超过 rule_limit 记为慢规则
+    - 累计耗时超过 limit 后，其余正则不再执行（记入 skipped），由调用方产生预算信号
+    - 单次 search 无法中途打断，硬性时限由执行器的受保护 worker 负责
+    """
+
+    __slots__ = ("limit", "rule_limit", "spent", "exhausted", "slow", "skipped")
+
+    def __init__(self, limit: float = 0.05, rule_limit: float = 0.01):
+        self.limit = limit
+        self.rule_limit = rule_limit
+        self.spent = 0.0
+        self.exhausted = False
+        self.slow: Dict[str, float] = {}
+        self.skipped: List[str] = []
+
+    def search(self, name: str, pattern: Any, text: str, *args: int):
+        if self.exhausted:
+            if name not in self.skipped:
+                self.skipped.append(name)
+            return None
+        started = time.perf_counter()
+        match = pattern.search(text, *args)
+        elapsed = time.perf_counter() - started
+        self.spent += elapsed
+        if elapsed > self.rule_limit and elapsed > self.slow.get(name, 0.0):
+            self.slow[name] = elapsed
+        if self.spent > self.limit:
+            self.exhausted = True
+        return match
+
+    def renew(self) -> None:
+        """进入下一个窗口：恢复额度，慢规则与跳过记录继续累计。"""
+        self.spent = 0.0
+        self.exhausted = False
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.slow or self.skipped)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "slow_rules": {name: round(seconds * 1000, 3) for name, seconds in self.slow.items()},
+            "skipped": list(self.skipped),
+        }
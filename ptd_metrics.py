@@ -0,0 +1,138 @@
+import bisect
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 直方图桶上界（秒），按 1-2-5 对数刻度从 10 µs 到 100 ms，最后一个桶收纳更慢的调用
+BUCKET_BOUNDS: Tuple[float, ...] = (
+    10e-6,
+    20e-6,
+    50e-6,
+    100e-6,
+    200e-6,
+    500e-6,
+    1e-3,
+    2e-3,
+    5e-3,
+    10e-3,
+    20e-3,
+    50e-3,
+    100e-3,
+    float("inf"),
+)
+
+
+class RollingHistogram:
+    """
+    滚动窗口直方图
+    --------------
+    - 时间轴切分为固定长度的时间片（默认 60 秒 × 15 片），每片一组对数刻度桶计数
+    - 记录时只定位当前时间片并累加计数，过期时间片在复用时清零，内存占用固定
+    - 分位数取所在桶的上界（最后一个桶取窗口内最大值），精度受桶宽限制，适合看趋势与长尾
+    """
+
+    def __init__(self, slot_seconds: float = 60.0, slots: int = 15, bounds: Tuple[float, ...] = BUCKET_BOUNDS):
+        self.slot_seconds = max(1.0, float(slot_seconds))
+        self.bounds = bounds
+        self._slot_ids: List[int] = [-1] * max(1, int(slots))
+        self._counts: List[List[int]] = [[0] * len(bounds) for _ in self._slot_ids]
+        self._totals: List[float] = [0.0] * len(self._slot_ids)
+        self._maxima: List[float] = [0.0] * len(self._slot_ids)
+
+    @property
+    def window_seconds(self) -> float:
+        return self.slot_seconds * len(self._slot_ids)
+
+    def _current(self, now: Optional[float]) -> int:
+        slot_id = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        index = slot_id % len(self._slot_ids)
+        if self._slot_ids[index] != slot_id:
+            self._slot_ids[index] = slot_id
+            self._counts[index] = [0] * len(self.bounds)
+            self._totals[index] = 0.0
+            self._maxima[index] = 0.0
+        return index
+
+    def record(self, value: float, now: Optional[float] = None) -> None:
+        index = self._current(now)
+        self._counts[index][bisect.bisect_left(self.bounds, value)] += 1
+        self._totals[index] += value
+        if value > self._maxima[index]:
+            self._maxima[index] = value
+
+    def _live(self, now: Optional[float]) -> List[int]:
+        newest = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        oldest = newest - len(self._slot_ids) + 1
+        return [index for index, slot_id in enumerate(self._slot_ids) if oldest <= slot_id <= newest]
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, float]:
+        """汇总窗口内的调用次数、平均值、p50 / p99 与最大值（秒）。"""
+        live = self._live(now)
+        counts = [0] * len(self.bounds)
+        total = 0.0
+        maximum = 0.0
+        for index in live:
+            for bucket, count in enumerate(self._counts[index]):
+                counts[bucket] += count
+            total += self._totals[index]
+            maximum = max(maximum, self._maxima[index])
+        count = sum(counts)
+        return {
+            "count": count,
+            "total": total,
+            "mean": total / count if count else 0.0,
+            "p50": self._quantile(counts, count, 0.50, maximum),
+            "p99": self._quantile(counts, count, 0.99, maximum),
+            "max": maximum,
+        }
+
+    def _quantile(self, counts: List[int], count: int, fraction: float, maximum: float) -> float:
+        if not count:
+            return 0.0
+        target = fraction * count
+        seen = 0
+        for bucket, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                return min(self.bounds[bucket], maximum)
+        return maximum
+
+    def reset(self) -> None:
+        self._slot_ids = [-1] * len(self._slot_ids)
+
+
+class StageTimingStats:
+    """按分析阶段聚合 analyze 返回的 stage_timings，每个阶段一个滚动直方图。"""
+
+    def __init__(self, slot_seconds: float = 60.0, slots: int = 15):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self.histograms: Dict[str, RollingHistogram] = {}
+        self.samples = 0
+
+    @property
+    def window_seconds(self) -> float:
+        return self.slot_seconds * self.slots
+
+    def record(self, timings: Dict[str, float], now: Optional[float] = None) -> None:
+        if not timings:
+            return
+        now = time.monotonic() if now is None else now
+        for stage, seconds in timings.items():
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram(self.slot_seconds, self.slots)
+            histogram.record(seconds, now)
+        self.samples += 1
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        stages = {stage: histogram.snapshot(now) for stage, histogram in self.histograms.items()}
+        return {stage: row for stage, row in stages.items() if row["count"]}
+
+    def slowest(self, limit: int = 5, now: Optional[float] = None) -> List[Tuple[str, Dict[str, float]]]:
+        """按 p99、平均耗时排序，返回最慢的若干阶段。"""
+        rows: Iterable[Tuple[str, Dict[str, float]]] = self.snapshot(now).items()
+        return sorted(rows, key=lambda item: (item[1]["p99"], item[1]["mean"]), reverse=True)[:limit]
+
+    def reset(self) -> None:
+        self.histograms.clear()
+        self.samples = 0
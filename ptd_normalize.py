@@ -0,0 +1,68 @@
+import re
+import unicodedata
+from typing import Dict, Tuple
+
+# 零宽 / 不可见字符：常被插入关键词中间以规避匹配，直接删除
+_INVISIBLE_CHARS = (
+    "\u00ad"  # 软连字符
+    "\u034f"  # 组合用字形连接符
+    "\u061c"  # 阿拉伯字母标记
+    "\u180e"  # 蒙古文元音分隔符
+    "\u200b\u200c\u200d\u200e\u200f"  # 零宽空格 / 零宽（非）连接符 / 方向标记
+    "\u202a\u202b\u202c\u202d\u202e"  # 双向文本控制符
+    "\u2060\u2061\u2062\u2063\u2064"  # 单词连接符 / 不可见运算符
+    "\u2066\u2067\u2068\u2069"  # 双向隔离符
+    "\ufeff"  # BOM / 零宽不换行空格
+)
+
+# 与拉丁字母同形的西里尔 / 希腊字母，以及 re 在 IGNORECASE 下与 ASCII 等价、
+# 但 NFKC 与 str.lower() 都不会折叠的字符（İ / ı）
+_HOMOGLYPHS: Dict[str, str] = {
+    # 西里尔字母
+    "\u0410": "A", "\u0412": "B", "\u0415": "E", "\u041a": "K", "\u041c": "M", "\u041d": "H",
+    "\u041e": "O", "\u0420": "P", "\u0421": "C", "\u0422": "T", "\u0425": "X", "\u0423": "Y",
+    "\u0405": "S", "\u0406": "I", "\u0408": "J",
+    "\u0430": "a", "\u0435": "e", "\u043e": "o", "\u0440": "p", "\u0441": "c", "\u0443": "y",
+    "\u0445": "x", "\u0455": "s", "\u0456": "i", "\u0458": "j", "\u0501": "d", "\u04bb": "h",
+    "\u051b": "q", "\u051d": "w",
+    # 希腊字母
+    "\u0391": "A", "\u0392": "B", "\u0395": "E", "\u0396": "Z", "\u0397": "H", "\u0399": "I",
+    "\u039a": "K", "\u039c": "M", "\u039d": "N", "\u039f": "O", "\u03a1": "P", "\u03a4": "T",
+    "\u03a5": "Y", "\u03a7": "X",
+    "\u03bf": "o", "\u03bd": "v", "\u03b9": "i",
+    # 拉丁扩展（İ / ı / ɡ）
+    "\u0130": "I", "\u0131": "i", "\u0261": "g",
+}
+
+FOLD_TABLE = str.maketrans({**{char: None for char in _INVISIBLE_CHARS}, **_HOMOGLYPHS})
+_FOLD_TRIGGER = re.compile("[" + re.escape(_INVISIBLE_CHARS + "".join(_HOMOGLYPHS)) + "]")
+
+
+def fold_text(text: str) -> str:
+    """
+    统一折叠（保留大小写）：NFKC（全角转半角、兼容字符展开）→ 删除零宽字符 → 同形字母折叠。
+    纯 ASCII 文本原样返回；无需处理的文本不产生任何拷贝。
+    """
+    if text.isascii():
+        return text
+    if not unicodedata.is_normalized("NFKC", text):
+        text = unicodedata.normalize("NFKC", text)
+    if _FOLD_TRIGGER.search(text) is not None:
+        text = text.translate(FOLD_TABLE)
+    return text
+
+
+def normalize_text(text: str) -> Tuple[str, str]:
+    """
+    每条消息只执行一次的规范化流水线，返回 (folded, normalized)：
+    - folded：fold_text 的结果，供正则、载荷解码、外链等需要保留大小写的阶段使用
+    - normalized：folded 的小写形式，供特征词、结构标记、仇恨词表等字面量阶段使用
+    两者长度一致（İ 已提前折叠），同一下标在两份文本中指向同一字符。
+    """
+    folded = fold_text(text)
+    return folded, folded.lower()
+
+
+def normalize_term(term: str) -> str:
+    """规则词条使用与消息相同的流水线折叠，保证两侧口径一致。"""
+    return fold_text(term).lower()
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .ptd_matchers import LazyPattern  # type: ignore
+except ImportError:
+    from ptd_matchers import LazyPattern
+
+RULEPACK_FORMAT = 1
+# 2：词条改经 normalize_term 折叠后编译进字面量自动机
+ARTIFACT_FORMAT = 2
+DEFAULT_RULEPACK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "default.json")
+ARTIFACT_DIR_NAME = "__rulecache__"
+# 参与生成编译工件的模块：其中任一源码变化都会让已有工件失效，无需手动提升 ARTIFACT_FORMAT
+_BUILDER_MODULES = ("ptd_core.py", "ptd_matchers.py", "ptd_normalize.py", "ptd_rulepack.py")
+_builder_fingerprint: Optional[str] = None
+
+
+def builder_fingerprint() -> str:
+    """编译代码指纹：上述模块源码的摘要；源码不可读时（例如打包为 zip）退回为空，仅依赖 ARTIFACT_FORMAT。"""
+    global _builder_fingerprint
+    if _builder_fingerprint is None:
+        digest = hashlib.sha256()
+        base = os.path.dirname(os.path.abspath(__file__))
+        for name in _BUILDER_MODULES:
+            try:
+                with open(os.path.join(base, name), "rb") as handle:
+                    digest.update(handle.read())
+            except OSError:
+                _builder_fingerprint = ""
+                break
+        else:
+            _builder_fingerprint = digest.hexdigest()[:16]
+    return _builder_fingerprint
+
+_FLAG_VALUES: Dict[str, int] = {
+    "IGNORECASE": re.IGNORECASE,
+    "MULTILINE": re.MULTILINE,
+    "DOTALL": re.DOTALL,
+    "VERBOSE": re.VERBOSE,
+    "ASCII": re.ASCII,
+}
+
+
+def parse_flags(names: Optional[List[str]]) -> int:
+    flags = 0
+    for name in names or ():
+        value = _FLAG_VALUES.get(str(name).upper())
+        if value is None:
+            raise ValueError(f"未知的正则标志: {name}")
+        flags |= value
+    return flags
+
+
+def flag_names(flags: int) -> List[str]:
+    return [name for name, value in _FLAG_VALUES.items() if flags & value]
+
+
+class RulePack:
+    """
+    规则包
+    ------
+    - 源文件为 JSON：正则特征、特征词权重、结构标记、越狱语句、仇恨词表、恶意域名与评分阈值
+    - version 取源文件内容的 SHA-256 摘要，内容不变则版本不变，可直接作为缓存失效依据
+    - 源文件与编译工件均按需读取；正则以 LazyPattern 形式载入，首次参与匹配时才编译
+    - 编译工件（锚点表、字面量自动机）写入源文件旁的 __rulecache__ 目录，
+      冷启动与重载直接加载工件，写入失败时仅跳过缓存，不影响检测
+    """
+
+    def __init__(self, path: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.path = os.path.abspath(path or DEFAULT_RULEPACK_PATH)
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(self.path), ARTIFACT_DIR_NAME)
+        self._raw: Optional[bytes] = None
+        self._version: Optional[str] = None
+        self._data: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def default(cls) -> "RulePack":
+        return cls(DEFAULT_RULEPACK_PATH)
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            with open(self.path, "rb") as handle:
+                self._raw = handle.read()
+        return self._raw
+
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            self._version = hashlib.sha256(self.raw).hexdigest()[:16]
+        return self._version
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        if self._data is None:
+            data = json.loads(self.raw.decode("utf-8"))
+            self._validate(data)
+            self._data = data
+        return self._data
+
+    @property
+    def name(self) -> str:
+        return str(self.data.get("name") or os.path.basename(self.path))
+
+    def _validate(self, data: Any) -> None:
+        if not isinstance(data, dict):
+            raise ValueError(f"规则包格式错误: {self.path}")
+        if data.get("format", RULEPACK_FORMAT) != RULEPACK_FORMAT:
+            raise ValueError(f"不支持的规则包版本: {data.get('format')}")
+        for key in ("regex_signatures", "marker_keywords", "suspicious_phrases", "malicious_domains"):
+            if not isinstance(data.get(key, []), list):
+                raise ValueError(f"规则包字段 {key} 必须为列表")
+        if not isinstance(data.get("keyword_weights", {}), dict):
+            raise ValueError("规则包字段 keyword_weights 必须为对象")
+        for index, signature in enumerate(data.get("regex_signatures", [])):
+            missing = [key for key in ("name", "pattern", "weight") if key not in signature]
+            if missing:
+                raise ValueError(f"第 {index + 1} 条正则特征缺少字段: {', '.join(missing)}")
+
+    # ------------------------------------------------------------------ #
+    # 规则构造
+    # ------------------------------------------------------------------ #
+
+    def regex_signatures(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": item["name"],
+                "pattern": LazyPattern(item["pattern"], parse_flags(item.get("flags"))),
+                "weight": int(item["weight"]),
+                "description": item.get("description") or item["name"],
+            }
+            for item in self.data.get("regex_signatures", [])
+        ]
+
+    def keyword_weights(self) -> Dict[str, int]:
+        return {str(keyword): int(weight) for keyword, weight in self.data.get("keyword_weights", {}).items()}
+
+    def terms(self, key: str) -> List[str]:
+        return [str(term) for term in self.data.get(key, [])]
+
+    def hate_terms(self, section: str) -> List[str]:
+        return [str(term) for term in self.data.get("hate", {}).get(section, [])]
+
+    def hate_request_patterns(self) -> List[LazyPattern]:
+        return [
+            LazyPattern(item["pattern"], parse_flags(item.get("flags")))
+            for item in self.data.get("hate", {}).get("request_patterns", [])
+        ]
+
+    def thresholds(self, medium: int, high: int) -> Tuple[int, int]:
+        thresholds = self.data.get("thresholds", {})
+        return int(thresholds.get("medium", medium)), int(thresholds.get("high", high))
+
+    # ------------------------------------------------------------------ #
+    # 编译工件
+    # ------------------------------------------------------------------ #
+
+    def artifact_key(self, core_version: str) -> str:
+        raw = (
+            f"{self.version}|{core_version}|{ARTIFACT_FORMAT}|{builder_fingerprint()}|"
+            f"{sys.version_info[0]}.{sys.version_info[1]}"
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+    def artifact_path(self, key: str) -> str:
+        stem = os.path.splitext(os.path.basename(self.path))[0]
+        return os.path.join(self.cache_dir, f"{stem}.{key}.pkl")
+
+    def load_artifact(self, key: str) -> Optional[Any]:
+        path = self.artifact_path(key)
+        try:
+            with open(path, "rb") as handle:
+                payload = pickle.load(handle)
+        except Exception:
+            return None
+        if not isinstance(payload, dict) or payload.get("key") != key:
+            return None
+        return payload.get("compiled")
+
+    def store_artifact(self, key: str, compiled: Any) -> bool:
+        path = self.artifact_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, "wb") as handle:
+                pickle.dump({"key": key, "compiled": compiled}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # 进程池快照只需路径与版本，源文件内容与解析结果按需重新读取
+        return {"path": self.path, "cache_dir": self.cache_dir, "_version": self._version}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.path = state["path"]
+        self.cache_dir = state["cache_dir"]
+        self._version = state.get("_version")
+        self._raw = None
+        self._data = None
+
+    @staticmethod
+    def export(detector: Any) -> Dict[str, Any]:
+        """把检测器当前的规则导出为规则包结构，便于在代码中修改规则后落盘。"""
+        return {
+            "format": RULEPACK_FORMAT,
+            "name": detector.rule_pack.name if getattr(detector, "rule_pack", None) is not None else "ptd-custom",
+            "thresholds": {"medium": detector.medium_threshold, "high": detector.high_threshold},
+            "regex_signatures": [
+                {
+                    "name": signature["name"],
+                    "pattern": signature["pattern"].pattern,
+                    "flags": flag_names(signature["pattern"].flags),
+                    "weight": signature["weight"],
+                    "description": signature["description"],
+                }
+                for signature in detector.regex_signatures
+            ],
+            "keyword_weights": dict(detector.keyword_weights),
+            "marker_keywords": list(detector.marker_keywords),
+            "suspicious_phrases": list(detector.suspicious_phrases),
+            "hate": {
+                "targets": list(detector.hate_target_indicators),
+                "negatives": list(detector.hate_negative_indicators),
+                "incitements": list(detector.hate_incitement_indicators),
+                "emotions": list(detector.hate_emotion_indicators),
+                "requests": list(detector.hate_request_keywords),
+                "request_patterns": [
+                    {"pattern": pattern.pattern, "flags": flag_names(pattern.flags)}
+                    for pattern in detector.hate_request_patterns
+                ],
+            },
+            "malicious_domains": list(detector.malicious_domains),
+        }
@@ -0,0 +1,96 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Mapping as MappingType, Optional
+
+_DETAIL_LIMIT = 160
+
+
+class Signal(Mapping):
+    """
+    检测信号
+    --------
+    - __slots__ 紧凑存储类型、规则名（正则信号即规则 id）与权重，评分只需读取 weight
+    - detail 可以只保存原文引用与命中区间，description 可以只保存模板，
+      首次读取时才切片 / 格式化；绝大多数被直接放行的消息不会生成任何展示文本
+    - 实现只读 Mapping 接口（signal["detail"]、.get()、.items()、dict(signal)），与原先的字典用法兼容
+    - 序列化时先渲染 detail / description，不携带原文引用
+    """
+
+    __slots__ = ("type", "name", "weight", "_detail", "_description", "_source", "_span")
+
+    KEYS = ("type", "name", "detail", "weight", "description")
+
+    def __init__(
+        self,
+        type: str,
+        name: str,
+        weight: int,
+        detail: Optional[str] = None,
+        description: Optional[str] = None,
+        source: Optional[str] = None,
+        span: Optional[tuple] = None,
+    ):
+        self.type = type
+        self.name = name
+        self.weight = weight
+        self._detail = detail
+        self._description = description
+        self._source = source
+        self._span = span
+
+    @classmethod
+    def from_span(cls, type: str, name: str, weight: int, source: str, span: tuple, description: str) -> "Signal":
+        """detail 取 source[start:end]（截断至 160 字符），读取时才切片。"""
+        return cls(type, name, weight, description=description, source=source, span=span)
+
+    @classmethod
+    def from_template(cls, type: str, name: str, weight: int, template: str) -> "Signal":
+        """detail 即规则名，description 由模板（含 {name}）在读取时格式化。"""
+        return cls(type, name, weight, detail=name, source=template)
+
+    @property
+    def detail(self) -> str:
+        if self._detail is None:
+            start, end = self._span
+            self._detail = self._source[start:end][:_DETAIL_LIMIT]
+            self._source = None
+        return self._detail
+
+    @property
+    def description(self) -> str:
+        if self._description is None:
+            self._description = self._source.format(name=self.name)
+            self._source = None
+        return self._description
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+    def __reduce__(self):
+        return (Signal, (self.type, self.name, self.weight, self.detail, self.description))
+
+    def __repr__(self) -> str:
+        return f"Signal({self.type!r}, {self.name!r}, {self.weight!r})"
+
+
+def serializable_result(result: MappingType[str, Any]) -> Dict[str, Any]:
+    """
+    返回 analyze() 结果的浅拷贝，其中的 Signal 渲染为普通字典，可直接 json.dumps。
+    analyze() 本身保留 Signal 以便延迟生成展示文本，记录或导出结果时再调用本函数。
+    """
+    copied = dict(result)
+    if "signals" in copied:
+        copied["signals"] = [
+            signal.as_dict() if isinstance(signal, Signal) else dict(signal) for signal in copied["signals"] or ()
+        ]
+    return copied
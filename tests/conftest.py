@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 插件目录本身不是可安装的包，测试与基准脚本一样直接从仓库根目录导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
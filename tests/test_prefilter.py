@@ -0,0 +1,22 @@
+"""良性旁路预筛的无漏报保证：被预筛直接放行的消息，完整分析也不会命中任何规则。"""
+
+import pytest
+
+from benchmarks.corpus import attack_messages, benign_messages, fragment_messages
+from ptd_core import PromptThreatDetector
+
+
+@pytest.fixture(scope="module")
+def detector():
+    detector = PromptThreatDetector()
+    assert detector.prefilter is not None, "内置规则集应当能够启用预筛"
+    return detector
+
+
+def test_prefilter_structure(detector):
+    assert detector.verify_prefilter() == []
+
+
+def test_prefilter_never_drops_a_rule_match(detector):
+    samples = benign_messages(5000) + attack_messages(500) + fragment_messages(detector, 20000)
+    assert detector.verify_prefilter(samples) == []
@@ -0,0 +1,34 @@
+"""回溯风险估计：聊天中常见的方括号占位符不应被误判，真正的最坏输入仍须被识别。"""
+
+import pickle
+
+import pytest
+
+from ptd_core import PromptThreatDetector
+from ptd_normalize import normalize_text
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return PromptThreatDetector()
+
+
+def hazard(detector, text):
+    return detector.regex_hazard(normalize_text(text)[1])
+
+
+@pytest.mark.parametrize("text", ["[图片] " * 100, "[表情][图片] " * 500, "[12:00:01] 早上好 " * 3])
+def test_placeholders_are_not_hazards(detector, text):
+    assert hazard(detector, text) is None
+
+
+def test_log_forgery_flood_is_a_hazard(detector):
+    result = hazard(detector, "[77:77:77]" * 400)
+    assert result is not None and result.rule == "伪造日志标签"
+
+
+def test_profiles_survive_snapshot(detector):
+    restored = pickle.loads(pickle.dumps(detector._backtrack_profiles))
+    text = normalize_text("[77:77:77]" * 400)[1]
+    original = {profile.name: profile.estimate(text, 10**6) for profile in detector._backtrack_profiles}
+    assert {profile.name: profile.estimate(text, 10**6) for profile in restored} == original